@@ -0,0 +1,41 @@
+"""query journal
+
+Revision ID: 002_query_journal
+Revises: 001_initial
+Create Date: 2026-10-19 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '002_query_journal'
+down_revision = '001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'query_journal',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('trace_id', sa.String(16), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=True),
+        sa.Column('chat_id', sa.BigInteger(), nullable=True),
+        sa.Column('question', sa.Text(), nullable=False),
+        sa.Column('sql', sa.Text(), nullable=True),
+        sa.Column('result', sa.BigInteger(), nullable=True),
+        sa.Column('outcome', sa.String(16), nullable=False),
+        sa.Column('latency_ms', sa.Float(), nullable=False),
+        sa.Column('stages', postgresql.JSONB(), nullable=False, server_default='{}'),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_index('ix_query_journal_created_at', 'query_journal', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_query_journal_created_at', table_name='query_journal')
+    op.drop_table('query_journal')
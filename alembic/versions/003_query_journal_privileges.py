@@ -0,0 +1,55 @@
+"""query journal privileges
+
+Revision ID: 003_query_journal_privileges
+Revises: 002_query_journal
+Create Date: 2026-10-19 18:00:00
+
+"""
+from alembic import op
+
+from app.config import settings
+
+
+revision = '003_query_journal_privileges'
+down_revision = '002_query_journal'
+branch_labels = None
+depends_on = None
+
+
+def run_if_role_exists(role: str, statements: str) -> None:
+    op.execute(f"""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT FROM pg_roles WHERE rolname = '{role}') THEN
+                {statements}
+            END IF;
+        END
+        $$
+    """)
+
+
+def upgrade() -> None:
+    # init-db.sh grants the bot's read-only role SELECT on every future
+    # table; the journal holds every user's questions and must stay out of
+    # reach of generated SQL
+    readonly = settings.POSTGRES_READONLY_USER
+    writer = settings.JOURNAL_WRITER_USER
+    run_if_role_exists(
+        readonly, f'REVOKE ALL ON query_journal FROM "{readonly}";'
+    )
+    run_if_role_exists(writer, f"""
+        GRANT INSERT ON query_journal TO "{writer}";
+        GRANT USAGE ON SEQUENCE query_journal_id_seq TO "{writer}";
+    """)
+
+
+def downgrade() -> None:
+    readonly = settings.POSTGRES_READONLY_USER
+    writer = settings.JOURNAL_WRITER_USER
+    run_if_role_exists(writer, f"""
+        REVOKE ALL ON query_journal FROM "{writer}";
+        REVOKE ALL ON SEQUENCE query_journal_id_seq FROM "{writer}";
+    """)
+    run_if_role_exists(
+        readonly, f'GRANT SELECT ON query_journal TO "{readonly}";'
+    )
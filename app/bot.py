@@ -1,23 +1,58 @@
 import asyncio
+import atexit
 import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import Command
 from aiogram.types import Message
+from sqlalchemy.exc import DBAPIError
 
 from app.config import settings
-from app.db import db
-from app.cache import cache
+from app.const import (
+    FAILURE_REPLY_TIMEOUT,
+    MAX_BATCH_DB_CONCURRENCY,
+    MAX_BATCH_QUESTIONS,
+)
+from app.db import db, failure_reason
+from app.cache import KnownFailure, cache
+from app.journal import query_journal
 from app.llm_processor import llm_processor
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from app.metrics import metrics_server, queries
+from app.middlewares import RateLimitMiddleware
+from app.rate_limit import rate_limiter
+from app.speculation import Speculation, sql_speculator
+from app.tasks import Deadline, chat_tasks
+from app.tracing import (
+    Trace,
+    current_trace,
+    set_attribute,
+    span,
+    start_trace,
 )
+from app.warmer import cache_warmer
+
+# Records are formatted and written by a listener thread, so logging
+# never blocks the event loop on stdout
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+))
+log_listener = QueueListener(log_queue, log_handler)
+queue_handler = QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
 dp = Dispatcher()
+dp.message.middleware(RateLimitMiddleware())
 
 
 @dp.message(Command('start'))
@@ -54,57 +89,340 @@ async def cmd_clear_cache(message: Message):
     await message.answer('Кэш очищен!')
 
 
-@dp.message(F.text)
-async def process_query(message: Message):
-    """Process natural language query."""
+async def reply(
+    message: Message, text: str, deadline: Optional[Deadline] = None
+):
+    """Answer a message, bounding the Telegram call by the deadline."""
+    request_timeout = deadline.remaining_seconds() if deadline else None
+    await bot(message.answer(text), request_timeout=request_timeout)
+
+
+async def reply_failure(message: Message, text: str):
+    """Answer with a failure; the request deadline may be spent already."""
+    await reply(message, text, Deadline(FAILURE_REPLY_TIMEOUT))
+
+
+FAILURE_OUTCOMES = {
+    'validation': 'invalid',
+    'execution': 'error',
+    'timeout': 'timeout',
+}
+FAILURE_REPLIES = {
+    'timeout': (
+        'Запрос выполнялся слишком долго.\n'
+        'Попробуйте упростить вопрос.'
+    ),
+    'invalid': (
+        'Не удалось обработать запрос.\n'
+        'Пожалуйста, переформулируйте вопрос.'
+    ),
+    'error': (
+        'Произошла ошибка при обработке запроса.\n'
+        'Попробуйте еще раз или переформулируйте вопрос.'
+    ),
+}
+
+
+def record_outcome(trace: Trace, outcome: str, failed: bool = False):
+    """Count the query outcome and attach it to the request trace."""
+    queries[outcome].inc()
+    trace.attributes['outcome'] = outcome
+    if failed:
+        trace.error = outcome
+
+
+def llm_tokens() -> int:
+    """LLM tokens spent so far by the current request."""
+    trace = current_trace()
+    return trace.attributes.get('llm_tokens', 0) if trace else 0
+
+
+async def generate_sql(user_query: str, deadline: Deadline) -> str:
+    """Ask the LLM for SQL, remembering questions that fail validation."""
+    try:
+        return await llm_processor.text_to_sql(
+            user_query, timeout=deadline.remaining()
+        )
+    except ValueError:
+        await cache.set_failure(user_query, 'validation', tokens=llm_tokens())
+        raise
+
+
+async def execute_sql(
+    user_query: str, sql_query: str, deadline: Deadline,
+    speculation: Optional[Speculation] = None
+) -> int:
+    """Run SQL, or take the speculative result when it is equivalent.
+
+    SQL that fails deterministically in PostgreSQL, or times out with at
+    least half of the request budget, is remembered with its question in
+    the negative cache; transient database errors are not.
+    """
+    set_attribute('sql', sql_query)
+    reason = await cache.get_sql_failure(sql_query)
+    if reason is not None:
+        raise KnownFailure(reason)
+    timeout_ms = deadline.remaining_ms()
+    try:
+        result = None
+        if speculation is not None:
+            result = await speculation.result_for(sql_query)
+        if result is None:
+            result = await db.execute_raw_query(
+                sql_query, timeout_ms=timeout_ms
+            )
+        return result
+    except (asyncio.TimeoutError, DBAPIError) as e:
+        reason = failure_reason(e, timeout_ms)
+        if reason is None:
+            raise
+        await cache.set_failure(
+            user_query, reason, sql=sql_query, tokens=llm_tokens()
+        )
+        if reason == 'timeout':
+            raise
+        logger.error(f'SQL execution error: {e}')
+        raise KnownFailure(reason) from e
+
+
+async def answer_batch(
+    message: Message, questions: List[str], deadline: Deadline
+) -> str:
+    """Answer several questions from one message with a combined reply.
+
+    Only the first ``MAX_BATCH_QUESTIONS`` are answered and the reply says
+    how many were left out. Cache hits are resolved first and questions
+    known to fail are skipped; the remaining questions share a single LLM
+    call and their SQL runs at most ``MAX_BATCH_DB_CONCURRENCY`` at once.
+    New failures are recorded in the negative cache. Returns the outcome
+    to record; raises ``ValueError`` when no question could be answered.
+    """
+    set_attribute('questions', len(questions))
+    skipped = max(0, len(questions) - MAX_BATCH_QUESTIONS)
+    questions = questions[:MAX_BATCH_QUESTIONS]
+    results: List[Optional[int]] = list(
+        await asyncio.gather(*(cache.get(q) for q in questions))
+    )
+    misses = [i for i, result in enumerate(results) if result is None]
+    if not misses:
+        outcome = 'cached'
+    else:
+        outcome = 'answered'
+        failures = await asyncio.gather(
+            *(cache.get_failure(questions[i]) for i in misses)
+        )
+        misses = [i for i, failure in zip(misses, failures) if not failure]
+        statements = await asyncio.gather(
+            *(cache.get_sql(questions[i]) for i in misses)
+        )
+        sql_by_index = dict(zip(misses, statements))
+        to_generate = [i for i in misses if sql_by_index[i] is None]
+        if to_generate:
+            generated = await llm_processor.text_to_sql_batch(
+                [questions[i] for i in to_generate],
+                timeout=deadline.remaining()
+            )
+            sql_by_index.update(zip(to_generate, generated))
+            tokens = llm_tokens() // len(to_generate)
+            for i, sql in zip(to_generate, generated):
+                if sql is None:
+                    await cache.set_failure(
+                        questions[i], 'validation', tokens=tokens
+                    )
+        else:
+            tokens = 0
+        candidates = [i for i in misses if sql_by_index[i] is not None]
+        sql_failures = await asyncio.gather(
+            *(cache.get_sql_failure(sql_by_index[i]) for i in candidates)
+        )
+        runnable = [
+            i for i, failure in zip(candidates, sql_failures) if not failure
+        ]
+        timeout_ms = deadline.remaining_ms()
+        # The batch holds one scheduler slot, so it may not take a pool
+        # connection per question
+        semaphore = asyncio.Semaphore(MAX_BATCH_DB_CONCURRENCY)
+
+        async def execute(sql: str) -> int:
+            async with semaphore:
+                return await db.execute_raw_query(sql, timeout_ms=timeout_ms)
+
+        executed = await asyncio.gather(
+            *(execute(sql_by_index[i]) for i in runnable),
+            return_exceptions=True
+        )
+        for i, result in zip(runnable, executed):
+            if isinstance(result, Exception):
+                logger.warning(f'Batch question {i + 1} failed: {result}')
+                reason = failure_reason(result, timeout_ms)
+                if reason is not None:
+                    await cache.set_failure(
+                        questions[i], reason,
+                        sql=sql_by_index[i], tokens=tokens
+                    )
+                continue
+            results[i] = result
+            await cache.set(questions[i], result, sql=sql_by_index[i])
+            sql_speculator.remember(questions[i], sql_by_index[i])
+    if all(result is None for result in results):
+        raise ValueError('No question in the batch could be answered')
+    lines = [
+        f'{i}. {question} — '
+        f'{result if result is not None else "не удалось ответить"}'
+        for i, (question, result) in enumerate(zip(questions, results), 1)
+    ]
+    if skipped:
+        lines.append(
+            f'\nОстальные вопросы ({skipped}) не обработаны: за раз '
+            f'отвечаю не больше чем на {MAX_BATCH_QUESTIONS}. '
+            'Отправьте их отдельным сообщением.'
+        )
+    with span('send'):
+        await reply(message, '\n'.join(lines), deadline)
+    return outcome
+
+
+@dp.message(F.text, flags={'rate_limit': True})
+async def process_query(message: Message,
+                        deadline: Optional[Deadline] = None,
+                        queued_at: Optional[float] = None):
+    """Process natural language query.
+
+    A newer message from the same chat cancels this one, and every stage
+    shares a single deadline of ``REQUEST_TIMEOUT`` seconds, started by
+    ``RateLimitMiddleware`` before the wait for a query slot; that wait is
+    added to the trace as the ``queue`` span, outside ``total``. Messages
+    with several questions are answered together by ``answer_batch``.
+    """
     user_query = message.text.strip()
     if not user_query:
         await message.answer('Пожалуйста, задайте вопрос')
         return
-    logger.info(f'User query from {message.from_user.id}: {user_query}')
-    await bot.send_chat_action(message.chat.id, 'typing')
-    try:
-        # Check cache first
-        cached_result = await cache.get(user_query)
-        if cached_result is not None:
-            await message.answer(f'{cached_result}')
-            logger.info(f'Returned cached result: {cached_result}')
-            return
-        # Convert natural language to SQL
-        sql_query = await llm_processor.text_to_sql(user_query)
-        # Execute SQL query
-        result = await db.execute_raw_query(sql_query)
-        # Cache the result
-        await cache.set(user_query, result)
-        # Send result
-        await message.answer(f'{result}')
-        logger.info(f'Query result: {result}')
-    except ValueError as e:
-        logger.error(f'Validation error: {e}')
-        await message.answer(
-            'Не удалось обработать запрос.\n'
-            'Пожалуйста, переформулируйте вопрос.'
-        )
-    except Exception as e:
-        logger.error(f'Error processing query: {e}', exc_info=True)
-        await message.answer(
-            'Произошла ошибка при обработке запроса.\n'
-            'Попробуйте еще раз или переформулируйте вопрос.'
-        )
+    logger.debug(f'User query from {message.from_user.id}: {user_query}')
+    if deadline is None:
+        deadline = Deadline(settings.REQUEST_TIMEOUT)
+    with (
+        chat_tasks.track(message.chat.id, message.message_id),
+        start_trace(
+            'process_query',
+            user_id=message.from_user.id,
+            chat_id=message.chat.id,
+            query=user_query,
+        ) as trace,
+        span('total'),
+    ):
+        if queued_at is not None:
+            trace.add_span('queue', queued_at, trace.started - queued_at, {})
+        try:
+            async with asyncio.timeout(deadline.remaining()):
+                await bot.send_chat_action(
+                    message.chat.id, 'typing',
+                    request_timeout=deadline.remaining_seconds()
+                )
+                questions = llm_processor.split_questions(user_query)
+                if len(questions) > 1:
+                    outcome = await answer_batch(message, questions, deadline)
+                    record_outcome(trace, outcome)
+                    return
+                # Check cache first
+                cached_result = await cache.get(user_query)
+                if cached_result is not None:
+                    with span('send'):
+                        await reply(message, f'{cached_result}', deadline)
+                    record_outcome(trace, 'cached')
+                    trace.attributes['result'] = cached_result
+                    logger.debug(f'Returned cached result: {cached_result}')
+                    return
+                failure = await cache.get_failure(user_query)
+                if failure is not None:
+                    raise KnownFailure(failure[0])
+                # Reuse SQL generated earlier, else ask the LLM while a
+                # predicted query runs speculatively
+                sql_query = await cache.get_sql(user_query)
+                if sql_query is None:
+                    async with sql_speculator.speculate(
+                        user_query, deadline
+                    ) as speculation:
+                        sql_query = await generate_sql(user_query, deadline)
+                        result = await execute_sql(
+                            user_query, sql_query, deadline, speculation
+                        )
+                else:
+                    result = await execute_sql(user_query, sql_query, deadline)
+                # Cache the result
+                await cache.set(user_query, result, sql=sql_query)
+                sql_speculator.remember(user_query, sql_query)
+                # Send result
+                with span('send'):
+                    await reply(message, f'{result}', deadline)
+                record_outcome(trace, 'answered')
+                trace.attributes['result'] = result
+                logger.debug(f'Query result: {result}')
+        except asyncio.CancelledError:
+            record_outcome(trace, 'cancelled')
+            logger.info(
+                f'Query from chat {message.chat.id} superseded, cancelled'
+            )
+            raise
+        except KnownFailure as e:
+            outcome = FAILURE_OUTCOMES[e.reason]
+            record_outcome(trace, outcome, failed=True)
+            logger.info(f'Known {e.reason} failure, LLM skipped')
+            await reply_failure(message, FAILURE_REPLIES[outcome])
+        except asyncio.TimeoutError:
+            record_outcome(trace, 'timeout', failed=True)
+            logger.warning(
+                f'Query exceeded {settings.REQUEST_TIMEOUT}s deadline'
+            )
+            await reply_failure(message, FAILURE_REPLIES['timeout'])
+        except ValueError as e:
+            record_outcome(trace, 'invalid', failed=True)
+            logger.error(f'Validation error: {e}')
+            await reply_failure(message, FAILURE_REPLIES['invalid'])
+        except Exception as e:
+            record_outcome(trace, 'error', failed=True)
+            logger.error(f'Error processing query: {e}', exc_info=True)
+            await reply_failure(message, FAILURE_REPLIES['error'])
+
+
+async def prewarm():
+    """Pay connection setup before the first user instead of during it."""
+    tasks = [
+        llm_processor.prewarm(settings.PREWARM_LLM_TIMEOUT),
+        sql_speculator.load(),
+    ]
+    if settings.PREWARM_DB_CONNECTIONS > 0:
+        tasks.append(db.prewarm(settings.PREWARM_DB_CONNECTIONS))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning(f'Prewarm step failed: {result}')
 
 
-async def on_startup():
+async def on_startup(metrics_port: Optional[int] = None):
     logger.info('Starting bot...')
-    settings.validate()
+    started = time.perf_counter()
+    # Settings are validated once, when app.config is imported
     db.init()
+    await metrics_server.start(metrics_port)
     await cache.connect()
-    logger.info('Bot started successfully')
+    await prewarm()
+    await cache_warmer.start()
+    await rate_limiter.start()
+    await query_journal.start()
+    metrics_server.ready = True
+    logger.info(f'Bot ready in {time.perf_counter() - started:.2f}s')
 
 
 async def on_shutdown():
     logger.info('Shutting down bot...')
+    chat_tasks.cancel_all()
+    await cache_warmer.stop()
+    await rate_limiter.stop()
+    await query_journal.stop()
     await db.close()
     await cache.close()
+    await metrics_server.stop()
     await bot.session.close()
     logger.info('Bot shut down successfully')
 
@@ -1,20 +1,63 @@
 import hashlib
 import logging
-from typing import Optional
+import random
+import re
+from typing import List, Optional, Tuple
 
 import redis.asyncio as redis
 
 from app.config import settings
+from app.const import (
+    DATA_VERSION_CHANNEL,
+    DATA_VERSION_KEY,
+    QUERY_FREQ_KEY,
+    QUERY_FREQ_LIMIT,
+    QUERY_FREQ_TRIM_RATE,
+)
+from app.llm_processor import canonical_sql
+from app.metrics import (
+    cache_errors,
+    cache_hits,
+    cache_misses,
+    llm_saved_tokens,
+    negative_question_hits,
+    negative_sql_hits,
+)
+from app.tracing import span
 
 logger = logging.getLogger(__name__)
 
 
+class KnownFailure(Exception):
+    """Question or SQL that failed recently for a classified reason."""
+
+    def __init__(self, reason: str):
+        super().__init__(f'Known failure: {reason}')
+        self.reason = reason
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a question used for cache keys and hit counts."""
+    normalized = query.lower().replace('ё', 'е')
+    normalized = ' '.join(normalized.split())
+    return re.sub(r'[\s?!.,;:]+$', '', normalized)
+
+
 class Cache:
-    """Redis cache manager."""
+    """Redis cache manager.
+
+    Results are keyed by the normalized question and the current data
+    version, so an ingest invalidates them by bumping the version. The
+    generated SQL is kept separately and survives ingests. Questions and
+    SQL that fail deterministically are remembered for ``NEGATIVE_CACHE_TTL``
+    seconds so retries skip the LLM and the database.
+    """
 
     def __init__(self):
         self.client: Optional[redis.Redis] = None
         self.ttl = settings.CACHE_TTL
+        self.negative_ttl = settings.NEGATIVE_CACHE_TTL
+        self.data_version = 0
 
     async def connect(self):
         try:
@@ -24,6 +67,9 @@ class Cache:
                 decode_responses=True
             )
             await self.client.ping()
+            self.data_version = int(
+                await self.client.get(DATA_VERSION_KEY) or 0
+            )
             logger.info(f'Connected to Redis at {settings.REDIS_URL}')
         except Exception as e:
             logger.warning(f'Redis connection failed: {e}. Cache disabled.')
@@ -34,45 +80,189 @@ class Cache:
             await self.client.close()
             logger.info('Redis connection closed')
 
+    @staticmethod
+    def _hash(query: str) -> str:
+        # Use MD5 hash of normalized query as key
+        return hashlib.md5(normalize_query(query).encode()).hexdigest()
+
     def _make_key(self, query: str) -> str:
         """Generate cache key from query."""
-        # Use MD5 hash of query as key
-        return f'query:{hashlib.md5(query.encode()).hexdigest()}'
+        return f'query:{self.data_version}:{self._hash(query)}'
+
+    def _make_sql_key(self, query: str) -> str:
+        return f'sql:{self._hash(query)}'
+
+    def _make_failure_key(self, query: str) -> str:
+        return f'failed:{self._hash(query)}'
+
+    @staticmethod
+    def _make_failed_sql_key(sql: str) -> str:
+        fingerprint = canonical_sql(sql) or sql
+        return f'failed_sql:{hashlib.md5(fingerprint.encode()).hexdigest()}'
+
+    async def get(self, query: str, count: bool = True) -> Optional[int]:
+        """Get cached result for query.
 
-    async def get(self, query: str) -> Optional[int]:
-        """Get cached result for query."""
+        Unless ``count`` is false, the ask is also recorded in the question
+        frequency table used by the cache warmer, in the same round trip,
+        and in the hit ratio metrics. Background lookups pass ``False``.
+        A random ``QUERY_FREQ_TRIM_RATE`` share of the asks also trims the
+        table to its ``QUERY_FREQ_LIMIT`` most frequent questions.
+        """
         if not self.client:
             return None
         try:
             key = self._make_key(query)
-            value = await self.client.get(key)
+            with span('cache_lookup'):
+                pipe = self.client.pipeline(transaction=False)
+                pipe.get(key)
+                if count:
+                    pipe.zincrby(QUERY_FREQ_KEY, 1, normalize_query(query))
+                    if random.random() < QUERY_FREQ_TRIM_RATE:
+                        pipe.zremrangebyrank(
+                            QUERY_FREQ_KEY, 0, -QUERY_FREQ_LIMIT - 1
+                        )
+                value, *_ = await pipe.execute()
             if value is not None:
-                logger.info(f'Cache HIT for query: {query[:50]}...')
+                if count:
+                    cache_hits.inc()
+                logger.debug(f'Cache HIT for query: {query[:50]}...')
                 return int(value)
+            if count:
+                cache_misses.inc()
             logger.debug(f'Cache MISS for query: {query[:50]}...')
             return None
         except Exception as e:
+            cache_errors.inc()
             logger.error(f'Cache get error: {e}')
             return None
 
-    async def set(self, query: str, result: int):
-        """Cache query result."""
+    async def get_sql(self, query: str) -> Optional[str]:
+        """Get previously generated SQL for query."""
+        if not self.client:
+            return None
+        try:
+            return await self.client.get(self._make_sql_key(query))
+        except Exception as e:
+            logger.error(f'Cache get SQL error: {e}')
+            return None
+
+    async def set(self, query: str, result: int, sql: Optional[str] = None):
+        """Cache query result and, when given, the SQL that produced it."""
         if not self.client:
             return
         try:
-            key = self._make_key(query)
-            await self.client.set(key, str(result), ex=self.ttl)
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(self._make_key(query), str(result), ex=self.ttl)
+            if sql is not None:
+                pipe.set(self._make_sql_key(query), sql, ex=self.ttl)
+            await pipe.execute()
             logger.debug(f'Cached result for query: {query[:50]}...')
         except Exception as e:
             logger.error(f'Cache set error: {e}')
 
+    async def get_failure(
+        self, query: str, count: bool = True
+    ) -> Optional[Tuple[str, int]]:
+        """Reason and LLM tokens spent if the question failed recently.
+
+        Unless ``count`` is false, the hit and the tokens it saves are
+        recorded in the negative cache metrics.
+        """
+        if not self.client or self.negative_ttl <= 0:
+            return None
+        try:
+            value = await self.client.get(self._make_failure_key(query))
+            if value is None:
+                return None
+            reason, tokens = value.split(':')
+            if count:
+                negative_question_hits[reason].inc()
+                llm_saved_tokens[reason].inc(int(tokens))
+            return reason, int(tokens)
+        except Exception as e:
+            logger.error(f'Cache get failure error: {e}')
+            return None
+
+    async def set_failure(self, query: str, reason: str,
+                          sql: Optional[str] = None, tokens: int = 0):
+        """Remember a failed question and, when given, its failed SQL."""
+        if not self.client or self.negative_ttl <= 0:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(
+                self._make_failure_key(query), f'{reason}:{tokens}',
+                ex=self.negative_ttl
+            )
+            if sql is not None:
+                pipe.set(
+                    self._make_failed_sql_key(sql), reason,
+                    ex=self.negative_ttl
+                )
+            await pipe.execute()
+            logger.debug(f'Cached {reason} failure for: {query[:50]}...')
+        except Exception as e:
+            logger.error(f'Cache set failure error: {e}')
+
+    async def get_sql_failure(
+        self, sql: str, count: bool = True
+    ) -> Optional[str]:
+        """Reason if equivalent SQL failed recently; see ``get_failure``."""
+        if not self.client or self.negative_ttl <= 0:
+            return None
+        try:
+            reason = await self.client.get(self._make_failed_sql_key(sql))
+            if reason is not None and count:
+                negative_sql_hits[reason].inc()
+            return reason
+        except Exception as e:
+            logger.error(f'Cache get SQL failure error: {e}')
+            return None
+
+    async def top_queries(self, limit: int) -> List[str]:
+        """Most frequently asked normalized questions."""
+        if not self.client:
+            return []
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.zrevrange(QUERY_FREQ_KEY, 0, limit - 1)
+            # Keep the frequency table bounded
+            pipe.zremrangebyrank(QUERY_FREQ_KEY, 0, -QUERY_FREQ_LIMIT - 1)
+            queries, _ = await pipe.execute()
+            return queries
+        except Exception as e:
+            logger.error(f'Cache top queries error: {e}')
+            return []
+
+    async def refresh_data_version(self) -> bool:
+        """Re-read the data version from Redis; true if it changed."""
+        version = int(await self.client.get(DATA_VERSION_KEY) or 0)
+        changed = version != self.data_version
+        self.data_version = version
+        return changed
+
+    async def bump_data_version(self) -> Optional[int]:
+        """Invalidate cached results after new data has been loaded."""
+        if not self.client:
+            return None
+        try:
+            self.data_version = await self.client.incr(DATA_VERSION_KEY)
+            await self.client.publish(DATA_VERSION_CHANNEL, self.data_version)
+            logger.info(f'Data version bumped to {self.data_version}')
+            return self.data_version
+        except Exception as e:
+            logger.error(f'Cache data version error: {e}')
+            return None
+
     async def clear(self):
         if not self.client:
             return
         try:
             keys = []
-            async for key in self.client.scan_iter(match='query:*'):
-                keys.append(key)
+            for pattern in ('query:*', 'sql:*', 'failed:*', 'failed_sql:*'):
+                async for key in self.client.scan_iter(match=pattern):
+                    keys.append(key)
             if keys:
                 await self.client.delete(*keys)
                 logger.info(f'Cleared {len(keys)} cached queries')
@@ -1,4 +1,5 @@
 import os
+from urllib.parse import urlsplit
 
 from dotenv import load_dotenv
 
@@ -30,12 +31,112 @@ class Settings:
         # Redis
         self.REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
         self.CACHE_TTL = int(os.getenv('CACHE_TTL', '86400'))
+        # Negative cache - questions and SQL that failed, 0 disables
+        self.NEGATIVE_CACHE_TTL = int(os.getenv('NEGATIVE_CACHE_TTL', '300'))
+        # Cache warming - top-N popular questions recomputed on startup/ingest
+        self.CACHE_WARM_TOP_N = int(os.getenv('CACHE_WARM_TOP_N', '50'))
+        self.CACHE_WARM_CONCURRENCY = int(
+            os.getenv('CACHE_WARM_CONCURRENCY', '4')
+        )
+        # Speculative SQL - past questions indexed for prediction, 0 disables
+        self.SPECULATION_INDEX_SIZE = int(
+            os.getenv('SPECULATION_INDEX_SIZE', '500')
+        )
+        self.SPECULATION_MIN_SIMILARITY = float(
+            os.getenv('SPECULATION_MIN_SIMILARITY', '0.9')
+        )
         # Ollama
         self.OLLAMA_BASE_URL = os.getenv(
             'OLLAMA_BASE_URL', 'http://ollama.com'
         )
         self.OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'qwen3-coder:480b-cloud')
         self.OLLAMA_API_KEY = os.getenv('OLLAMA_API_KEY', '')
+        # Request handling - end-to-end deadline in seconds
+        self.REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '60'))
+        # Rate limiting - token buckets (capacity, tokens per second)
+        self.RATE_LIMIT_USER_CAPACITY = float(
+            os.getenv('RATE_LIMIT_USER_CAPACITY', '5')
+        )
+        self.RATE_LIMIT_USER_RATE = float(
+            os.getenv('RATE_LIMIT_USER_RATE', '0.2')
+        )
+        self.RATE_LIMIT_CHAT_CAPACITY = float(
+            os.getenv('RATE_LIMIT_CHAT_CAPACITY', '20')
+        )
+        self.RATE_LIMIT_CHAT_RATE = float(
+            os.getenv('RATE_LIMIT_CHAT_RATE', '1')
+        )
+        self.RATE_LIMIT_NOTIFY_INTERVAL = float(
+            os.getenv('RATE_LIMIT_NOTIFY_INTERVAL', '10')
+        )
+        # Fair scheduling - queries processed concurrently per process
+        self.MAX_CONCURRENT_QUERIES = int(
+            os.getenv('MAX_CONCURRENT_QUERIES', '10')
+        )
+        # Metrics - Prometheus endpoint, 0 disables it
+        self.METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+        self.METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+        # Tracing - sampled JSON traces, slow requests are always emitted
+        self.TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+        self.TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '5000'))
+        # Profiling - keep profiles of requests slower than PROFILE_SLOW_MS
+        self.PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', '0'))
+        self.PROFILE_SAMPLE_RATE = float(
+            os.getenv('PROFILE_SAMPLE_RATE', '0.05')
+        )
+        self.PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+        # Query journal - file, postgres or none
+        self.JOURNAL_BACKEND = os.getenv('JOURNAL_BACKEND', 'file')
+        self.JOURNAL_PATH = os.getenv(
+            'JOURNAL_PATH', 'journal/queries.jsonl'
+        )
+        # Writer role for the postgres backend: INSERT on query_journal only
+        self.JOURNAL_WRITER_USER = os.getenv(
+            'JOURNAL_WRITER_USER', 'journal_writer'
+        )
+        self.JOURNAL_DATABASE_URL = os.getenv('JOURNAL_DATABASE_URL', '')
+        self.JOURNAL_BUFFER_SIZE = int(
+            os.getenv('JOURNAL_BUFFER_SIZE', '10000')
+        )
+        self.JOURNAL_BATCH_SIZE = int(os.getenv('JOURNAL_BATCH_SIZE', '500'))
+        self.JOURNAL_FLUSH_INTERVAL = float(
+            os.getenv('JOURNAL_FLUSH_INTERVAL', '1')
+        )
+        # Startup prewarm - pool connections opened and LLM loaded before
+        # readiness is reported, 0 skips each
+        self.PREWARM_DB_CONNECTIONS = int(
+            os.getenv('PREWARM_DB_CONNECTIONS', '5')
+        )
+        self.PREWARM_LLM_TIMEOUT = float(
+            os.getenv('PREWARM_LLM_TIMEOUT', '10')
+        )
+        # Snapshot ingestion - Redis Stream shared by a consumer group
+        self.INGEST_STREAM = os.getenv('INGEST_STREAM', 'snapshots')
+        self.INGEST_GROUP = os.getenv('INGEST_GROUP', 'ingest')
+        self.INGEST_DEAD_LETTER_STREAM = os.getenv(
+            'INGEST_DEAD_LETTER_STREAM', 'snapshots:dead'
+        )
+        self.INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '1000'))
+        self.INGEST_BLOCK_MS = int(os.getenv('INGEST_BLOCK_MS', '1000'))
+        # Minimum seconds between cache invalidations while ingesting
+        self.INGEST_VERSION_INTERVAL = float(
+            os.getenv('INGEST_VERSION_INTERVAL', '60')
+        )
+        # Webhook mode - aiohttp server plus worker processes
+        self.WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+        self.WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+        self.WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+        self.WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+        self.WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+        self.WEBHOOK_WORKERS = int(
+            os.getenv('WEBHOOK_WORKERS', str(os.cpu_count() or 1))
+        )
+        self.WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '50'))
+        self.UPDATES_STREAM = os.getenv('UPDATES_STREAM', 'updates')
+        self.UPDATES_GROUP = os.getenv('UPDATES_GROUP', 'workers')
+        self.UPDATES_STREAM_MAXLEN = int(
+            os.getenv('UPDATES_STREAM_MAXLEN', '100000')
+        )
         self.validate()
 
     def validate(self):
@@ -54,12 +155,29 @@ class Settings:
             'POSTGRES_PORT': self.POSTGRES_PORT,
             'REDIS_URL': self.REDIS_URL,
             'CACHE_TTL': self.CACHE_TTL,
+            'REQUEST_TIMEOUT': self.REQUEST_TIMEOUT,
         }
         missing = [name for name, value in required_vars.items() if not value]
         if missing:
             raise ValueError(
                 f'Missing required environment variables: {", ".join(missing)}'
             )
+        if self.JOURNAL_BACKEND == 'postgres':
+            self.validate_journal_writer()
+
+    def validate_journal_writer(self):
+        """The postgres journal must use its own insert-only role."""
+        if not self.JOURNAL_DATABASE_URL:
+            raise ValueError(
+                'JOURNAL_BACKEND=postgres requires JOURNAL_DATABASE_URL '
+                f'with the {self.JOURNAL_WRITER_USER} role'
+            )
+        user = urlsplit(self.JOURNAL_DATABASE_URL).username
+        if user in (self.POSTGRES_ADMIN_USER, self.POSTGRES_READONLY_USER):
+            raise ValueError(
+                'JOURNAL_DATABASE_URL must use the journal writer role, '
+                f'not {user}'
+            )
 
     @property
     def DATABASE_URL_ADMIN(self) -> str:
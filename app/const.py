@@ -3,3 +3,34 @@ DEFAULT_ZERO = 0
 MAX_VID_ID = 36
 MAX_SNAP_ID = 32
 MAX_CREATOR_ID = 32
+MAX_TRACE_ID = 16
+MAX_OUTCOME = 16
+
+# LLM
+MAX_BATCH_QUESTIONS = 10
+# Queries one batch runs at once: with MAX_CONCURRENT_QUERIES=10 slots this
+# stays within the pool's 10 connections plus 20 overflow
+MAX_BATCH_DB_CONCURRENCY = 3
+# Tables generated SQL may read; anything else, e.g. query_journal, is
+# rejected before execution
+QUERYABLE_TABLES = ('videos', 'video_snapshots')
+
+# Webhook
+CHAT_LATEST_TTL = 3600
+CHAT_CANCEL_CHANNEL = 'chat_cancel'
+STALE_UPDATE_IDLE_MS = 60000
+# Seconds on top of twice REQUEST_TIMEOUT before a pending update counts as
+# abandoned by its worker
+STALE_UPDATE_SLACK = 30
+# Seconds for a failure reply sent after the request deadline has passed
+FAILURE_REPLY_TIMEOUT = 10
+
+# Cache
+DATA_VERSION_KEY = 'data_version'
+DATA_VERSION_CHANNEL = 'data_version'
+QUERY_FREQ_KEY = 'query_freq'
+QUERY_FREQ_LIMIT = 10000
+# Share of counted asks that also trim the frequency table
+QUERY_FREQ_TRIM_RATE = 0.01
+WARM_LOCK_TTL = 300
+LISTEN_RETRY_MAX = 30
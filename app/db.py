@@ -1,8 +1,10 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 
 from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker,
@@ -11,9 +13,38 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from app.config import settings
+from app.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# SQLSTATE raised by PostgreSQL when statement_timeout cancels a query
+QUERY_CANCELED = '57014'
+# SQLSTATE classes that fail the same way on every run: data exceptions
+# (22) and syntax errors or undefined objects (42)
+DETERMINISTIC_SQLSTATE_CLASSES = ('22', '42')
+
+
+def failure_reason(
+    error: BaseException, timeout_ms: Optional[int]
+) -> Optional[str]:
+    """Negative cache reason for a query failure that would repeat.
+
+    Returns ``None`` for transient failures such as lost connections or
+    serialization errors, and for timeouts of queries that had less than
+    half of the request budget.
+    """
+    if isinstance(error, asyncio.TimeoutError):
+        if timeout_ms is not None and (
+            timeout_ms >= settings.REQUEST_TIMEOUT * 500
+        ):
+            return 'timeout'
+        return None
+    if isinstance(error, DBAPIError):
+        sqlstate = getattr(error.orig, 'sqlstate', None) or ''
+        if sqlstate[:2] in DETERMINISTIC_SQLSTATE_CLASSES:
+            return 'execution'
+    return None
+
 
 class Database:
     """Database connection manager."""
@@ -46,6 +77,21 @@ class Database:
         )
         logger.info('Database connection initialized')
 
+    async def prewarm(self, connections: int):
+        """Open pool connections ahead of the first query.
+
+        The connections are checked out concurrently, so each one is a new
+        connection that stays in the pool afterwards.
+        """
+        connections = min(connections, self.engine.pool.size())
+
+        async def touch():
+            async with self.engine.connect() as conn:
+                await conn.execute(text('SELECT 1'))
+
+        await asyncio.gather(*(touch() for _ in range(connections)))
+        logger.info(f'Prewarmed {connections} database connections')
+
     async def close(self):
         if self.engine:
             await self.engine.dispose()
@@ -63,14 +109,35 @@ class Database:
                 await session.rollback()
                 raise
 
-    async def execute_raw_query(self, query: str) -> int:
-        """Execute a raw SQL query and return a single numeric result."""
-        async with self.session() as session:
-            result = await session.execute(text(query))
-            row = result.fetchone()
-            if row is None:
-                return 0
-            return int(row[0]) if row[0] is not None else 0
+    async def execute_raw_query(
+        self, query: str, timeout_ms: Optional[int] = None,
+        stage: str = 'db'
+    ) -> int:
+        """Execute a raw SQL query and return a single numeric result.
+
+        ``timeout_ms`` is applied as a transaction-local statement_timeout,
+        so PostgreSQL itself aborts the query once the budget is spent.
+        The query is timed as the ``stage`` span.
+        """
+        with span(stage):
+            async with self.session() as session:
+                try:
+                    if timeout_ms is not None:
+                        await session.execute(text(
+                            'SET LOCAL statement_timeout = '
+                            f'{int(timeout_ms)}'
+                        ))
+                    result = await session.execute(text(query))
+                except DBAPIError as e:
+                    if getattr(e.orig, 'sqlstate', None) == QUERY_CANCELED:
+                        raise asyncio.TimeoutError(
+                            'Query cancelled by statement_timeout'
+                        ) from e
+                    raise
+                row = result.fetchone()
+        if row is None:
+            return 0
+        return int(row[0]) if row[0] is not None else 0
 
 
 db = Database()
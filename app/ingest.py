@@ -0,0 +1,449 @@
+"""Continuous ingestion of snapshot events into PostgreSQL.
+
+Events are JSON objects shaped like the snapshots in ``videos.json``, plus
+``creator_id`` and ``video_created_at`` for videos not seen before. They
+are read from a Redis Stream through a consumer group, so several workers
+can share one stream, or tailed from a JSON lines file. Malformed events
+and snapshots of unknown videos go to a dead-letter stream.
+
+Usage:
+    python -m app.ingest
+    python -m app.ingest --file data/snapshots.jsonl
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError
+from sqlalchemy.dialects.postgresql import insert
+
+from app.cache import cache
+from app.config import settings
+from app.const import (
+    MAX_CREATOR_ID,
+    MAX_SNAP_ID,
+    MAX_VID_ID,
+    STALE_UPDATE_IDLE_MS,
+)
+from app.db import db
+from app.models import Video, VideoSnapshot
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+COUNT_FIELDS = (
+    'views_count', 'likes_count', 'comments_count', 'reports_count',
+)
+DELTA_FIELDS = tuple(f'delta_{field}' for field in COUNT_FIELDS)
+
+BIGINT_MIN, BIGINT_MAX = -2 ** 63, 2 ** 63 - 1
+# SQLSTATE classes of writes that fail the same way on every retry: data
+# exceptions (22) and integrity constraint violations (23)
+REJECTED_SQLSTATE_CLASSES = ('22', '23')
+
+videos_table = Video.__table__
+snapshots_table = VideoSnapshot.__table__
+
+
+def checked_id(value: Any, limit: int, field: str) -> str:
+    value = str(value)
+    if not value or len(value) > limit:
+        raise ValueError(f'{field} must be 1-{limit} characters')
+    return value
+
+
+def checked_count(value: Any, field: str) -> int:
+    value = int(value)
+    if not BIGINT_MIN <= value <= BIGINT_MAX:
+        raise ValueError(f'{field} is out of BIGINT range')
+    return value
+
+
+def is_rejected(error: DBAPIError) -> bool:
+    """Whether the database refuses the data itself, not the connection."""
+    if isinstance(error, (DataError, IntegrityError)):
+        return True
+    sqlstate = getattr(error.orig, 'sqlstate', None) or ''
+    return sqlstate[:2] in REJECTED_SQLSTATE_CLASSES
+
+
+def parse_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Snapshot row from an event; timestamps are ISO 8601."""
+    created_at = datetime.fromisoformat(event['created_at'])
+    row = {
+        'id': checked_id(event['id'], MAX_SNAP_ID, 'id'),
+        'video_id': checked_id(event['video_id'], MAX_VID_ID, 'video_id'),
+        'created_at': created_at,
+        'updated_at': datetime.fromisoformat(
+            event.get('updated_at', event['created_at'])
+        ),
+    }
+    for field in COUNT_FIELDS + DELTA_FIELDS:
+        row[field] = checked_count(event.get(field, 0), field)
+    return row
+
+
+def new_video_rows(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Video rows for events that carry the data to create their video."""
+    videos = {}
+    for event in events:
+        if 'creator_id' not in event or 'video_created_at' not in event:
+            continue
+        created_at = datetime.fromisoformat(event['video_created_at'])
+        video_id = checked_id(event['video_id'], MAX_VID_ID, 'video_id')
+        videos[video_id] = {
+            'id': video_id,
+            'creator_id': checked_id(
+                event['creator_id'], MAX_CREATOR_ID, 'creator_id'
+            ),
+            'video_created_at': created_at,
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+    return list(videos.values())
+
+
+def decode_event(payload: Optional[str]) -> Dict[str, Any]:
+    """Event from its JSON payload, checked to produce valid rows.
+
+    Raises ``ValueError``, ``KeyError`` or ``TypeError`` for malformed
+    events, which are dead-lettered instead of failing the batch.
+    """
+    event = json.loads(payload)
+    if not isinstance(event, dict):
+        raise TypeError('event is not an object')
+    parse_event(event)
+    new_video_rows([event])
+    return event
+
+
+def latest_snapshots(rows: List[Dict[str, Any]],
+                     inserted_ids: Set[str]) -> Dict[str, Dict[str, Any]]:
+    """Newest newly inserted snapshot of each video."""
+    latest: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        if row['id'] not in inserted_ids:
+            continue
+        current = latest.get(row['video_id'])
+        if current is None or row['created_at'] > current['created_at']:
+            latest[row['video_id']] = row
+    return latest
+
+
+class SnapshotIngestor:
+    """Write snapshot batches and keep ``videos`` counters current.
+
+    Each batch is one transaction: missing videos are created, snapshots
+    are inserted idempotently (replays are no-ops), and every touched video
+    takes the counters of its newest snapshot. The cache data version is
+    bumped at most once per ``INGEST_VERSION_INTERVAL`` seconds so a steady
+    stream does not keep invalidating every cached answer.
+    """
+
+    def __init__(self):
+        self.version_interval = settings.INGEST_VERSION_INTERVAL
+        self.last_bump = float('-inf')
+        self.pending_bump = False
+        self.total = 0
+
+    async def write(
+        self, events: List[Dict[str, Any]]
+    ) -> Tuple[int, List[int]]:
+        """Write a batch; return the inserted count and orphan indices.
+
+        Orphans are snapshots of unknown videos whose events do not carry
+        the data to create the video; they are left out of the batch.
+        """
+        rows = [parse_event(event) for event in events]
+        if not rows:
+            return 0, []
+        async with db.session() as session:
+            videos = new_video_rows(events)
+            if videos:
+                await session.execute(
+                    insert(videos_table).on_conflict_do_nothing(), videos
+                )
+            unknown = (
+                {row['video_id'] for row in rows}
+                - {video['id'] for video in videos}
+            )
+            if unknown:
+                existing = await session.execute(
+                    select(videos_table.c.id)
+                    .where(videos_table.c.id.in_(unknown))
+                )
+                unknown -= set(existing.scalars().all())
+            orphans = [
+                i for i, row in enumerate(rows) if row['video_id'] in unknown
+            ]
+            rows = [row for row in rows if row['video_id'] not in unknown]
+            if not rows:
+                return 0, orphans
+            inserted = await session.execute(
+                insert(snapshots_table)
+                .on_conflict_do_nothing()
+                .returning(snapshots_table.c.id),
+                rows,
+            )
+            inserted_ids = set(inserted.scalars().all())
+            latest = latest_snapshots(rows, inserted_ids)
+            if latest:
+                await session.execute(
+                    update(videos_table)
+                    .where(videos_table.c.id == bindparam('b_video_id'))
+                    .where(
+                        videos_table.c.updated_at
+                        <= bindparam('b_created_at')
+                    )
+                    .values(
+                        **{f: bindparam(f'b_{f}') for f in COUNT_FIELDS},
+                        updated_at=bindparam('b_created_at'),
+                    ),
+                    [
+                        {
+                            'b_video_id': video_id,
+                            'b_created_at': row['created_at'],
+                            **{f'b_{f}': row[f] for f in COUNT_FIELDS},
+                        }
+                        for video_id, row in latest.items()
+                    ],
+                )
+        self.total += len(inserted_ids)
+        if inserted_ids:
+            self.pending_bump = True
+        await self.maybe_bump_version()
+        return len(inserted_ids), orphans
+
+    async def maybe_bump_version(self, force: bool = False):
+        now = time.monotonic()
+        if not self.pending_bump:
+            return
+        if not force and now - self.last_bump < self.version_interval:
+            return
+        await cache.bump_data_version()
+        self.last_bump = now
+        self.pending_bump = False
+
+
+class StreamSource:
+    """Redis Stream read through a consumer group."""
+
+    def __init__(self, consumer: str):
+        self.consumer = consumer
+        self.stream = settings.INGEST_STREAM
+        self.group = settings.INGEST_GROUP
+        self.client = redis.from_url(
+            settings.REDIS_URL, encoding='utf-8', decode_responses=True
+        )
+
+    async def open(self):
+        try:
+            await self.client.xgroup_create(
+                self.stream, self.group, id='0', mkstream=True
+            )
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    @staticmethod
+    def _payloads(entries) -> List[Tuple[str, Optional[str]]]:
+        return [
+            (entry_id, fields.get('event'))
+            for entry_id, fields in entries
+            if fields
+        ]
+
+    async def read(self, count: int) -> List[Tuple[str, Optional[str]]]:
+        # Take over entries left pending by dead consumers first
+        _, stale, _ = await self.client.xautoclaim(
+            self.stream, self.group, self.consumer,
+            min_idle_time=STALE_UPDATE_IDLE_MS, start_id='0-0', count=count
+        )
+        if stale:
+            return self._payloads(stale)
+        response = await self.client.xreadgroup(
+            self.group, self.consumer, {self.stream: '>'},
+            count=count, block=settings.INGEST_BLOCK_MS
+        )
+        return [
+            item for _, entries in response or []
+            for item in self._payloads(entries)
+        ]
+
+    async def ack(self, entry_ids: List[str]):
+        if entry_ids:
+            await self.client.xack(self.stream, self.group, *entry_ids)
+
+    async def dead_letter(self, rejected: List[Tuple[str, str, str]]):
+        pipe = self.client.pipeline(transaction=False)
+        for entry_id, payload, error in rejected:
+            pipe.xadd(settings.INGEST_DEAD_LETTER_STREAM, {
+                'entry_id': entry_id,
+                'event': payload or '',
+                'error': error,
+            })
+        await pipe.execute()
+
+    async def close(self):
+        await self.client.close()
+
+
+class FileSource:
+    """JSON lines file followed like ``tail -f``.
+
+    Rejected lines are appended to a ``.dead`` file next to it.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.dead_path = self.path.with_name(self.path.name + '.dead')
+        self.file = None
+
+    async def open(self):
+        self.file = open(self.path, encoding='utf-8')
+
+    async def read(self, count: int) -> List[Tuple[str, Optional[str]]]:
+        entries = []
+        while len(entries) < count:
+            position = self.file.tell()
+            line = self.file.readline()
+            if not line.endswith('\n'):
+                # Nothing new, or a line still being written: read it
+                # again in full on the next poll
+                self.file.seek(position)
+                break
+            if line.strip():
+                entries.append((str(position), line))
+        if not entries:
+            await asyncio.sleep(settings.INGEST_BLOCK_MS / 1000)
+        return entries
+
+    async def ack(self, entry_ids: List[str]):
+        pass
+
+    async def dead_letter(self, rejected: List[Tuple[str, str, str]]):
+        with open(self.dead_path, 'a', encoding='utf-8') as f:
+            for _, payload, _ in rejected:
+                f.write(payload.rstrip('\n') + '\n')
+
+    async def close(self):
+        if self.file:
+            self.file.close()
+
+
+async def write_events(
+    ingestor: SnapshotIngestor,
+    valid: List[Tuple[str, Optional[str], Dict[str, Any]]],
+) -> Tuple[int, List[Tuple[str, str, str]]]:
+    """Write decoded events; return the inserted count and rejections.
+
+    When the database rejects the data itself, the batch is bisected until
+    the offending events are isolated, so they are dead-lettered instead
+    of being retried forever. Other errors propagate for a retry.
+    """
+    try:
+        inserted, orphans = await ingestor.write(
+            [event for *_, event in valid]
+        )
+    except DBAPIError as e:
+        if not is_rejected(e):
+            raise
+        if len(valid) == 1:
+            entry_id, payload, _ = valid[0]
+            return 0, [(entry_id, payload, f'rejected: {e.orig!r}')]
+        middle = len(valid) // 2
+        first, first_rejected = await write_events(ingestor, valid[:middle])
+        second, second_rejected = await write_events(
+            ingestor, valid[middle:]
+        )
+        return first + second, first_rejected + second_rejected
+    return inserted, [
+        (valid[i][0], valid[i][1], 'unknown video') for i in orphans
+    ]
+
+
+async def ingest_batch(source, ingestor: SnapshotIngestor,
+                       entries: List[Tuple[str, Optional[str]]]) -> int:
+    """Write valid events; dead-letter malformed and rejected ones."""
+    valid, rejected = [], []
+    for entry_id, payload in entries:
+        try:
+            valid.append((entry_id, payload, decode_event(payload)))
+        except (ValueError, KeyError, TypeError) as e:
+            rejected.append((entry_id, payload, f'invalid: {e!r}'))
+    inserted, refused = await write_events(ingestor, valid)
+    rejected.extend(refused)
+    if rejected:
+        logger.warning(f'Dead-lettered {len(rejected)} snapshot events')
+        await source.dead_letter(rejected)
+    await source.ack([entry_id for entry_id, _ in entries])
+    return inserted
+
+
+async def run(source, stopping: asyncio.Event):
+    ingestor = SnapshotIngestor()
+    db.init(use_admin=True)
+    await cache.connect()
+    await source.open()
+    try:
+        while not stopping.is_set():
+            # Reading the next batch only after the previous one committed
+            # is the backpressure: a slow database leaves events in Redis
+            entries = await source.read(settings.INGEST_BATCH_SIZE)
+            if not entries:
+                await ingestor.maybe_bump_version()
+                continue
+            while not stopping.is_set():
+                try:
+                    inserted = await ingest_batch(source, ingestor, entries)
+                    break
+                except Exception as e:
+                    # Transient, e.g. a lost connection: retry the same batch,
+                    # nothing was acked. Events the database refuses never
+                    # get here, write_events dead-letters them
+                    logger.error(f'Ingest batch failed, retrying: {e}')
+                    await asyncio.sleep(settings.INGEST_BLOCK_MS / 1000)
+            else:
+                break
+            logger.info(
+                f'Ingested {inserted}/{len(entries)} snapshots '
+                f'({ingestor.total} total)'
+            )
+        await ingestor.maybe_bump_version(force=True)
+    finally:
+        await source.close()
+        await cache.close()
+        await db.close()
+
+
+async def main(file_path: str = ''):
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    if file_path:
+        source = FileSource(file_path)
+    else:
+        source = StreamSource(f'{socket.gethostname()}-{os.getpid()}')
+    await run(source, stopping)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--file', default='', help='tail a JSON lines file')
+    args = parser.parse_args()
+    asyncio.run(main(args.file))
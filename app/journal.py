@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.config import settings
+from app.models import QueryJournalEntry
+from app.tracing import Trace, add_listener, remove_listener
+
+logger = logging.getLogger(__name__)
+
+
+def trace_to_entry(trace: Trace) -> Dict[str, Any]:
+    """Journal record of a finished process_query trace."""
+    attributes = trace.attributes
+    return {
+        'created_at': datetime.now(timezone.utc),
+        'trace_id': trace.trace_id,
+        'user_id': attributes.get('user_id'),
+        'chat_id': attributes.get('chat_id'),
+        'question': attributes.get('query', ''),
+        'sql': attributes.get('sql'),
+        'result': attributes.get('result'),
+        'outcome': attributes.get('outcome') or trace.error or 'unknown',
+        'latency_ms': round((trace.duration or 0) * 1000, 3),
+        'stages': {
+            span['name']: span['duration_ms'] for span in trace.spans
+        },
+    }
+
+
+class FileJournalBackend:
+    """Append-only JSON lines file, written from a worker thread.
+
+    Each batch is a single ``O_APPEND`` write, so batches from several
+    worker processes sharing the file do not interleave mid-line.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    async def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _append(self, data: bytes):
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+
+    async def write(self, entries: List[Dict[str, Any]]):
+        data = ''.join(
+            json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+            for entry in entries
+        ).encode('utf-8')
+        await asyncio.to_thread(self._append, data)
+
+    async def close(self):
+        pass
+
+
+class PostgresJournalBackend:
+    """``query_journal`` table written through its own writer connection.
+
+    The connection uses ``JOURNAL_WRITER_USER``, which may only insert into
+    the journal; the bot's read-only pool cannot read it at all.
+    """
+
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+        self.engine: Optional[AsyncEngine] = None
+
+    async def open(self):
+        self.engine = create_async_engine(
+            self.database_url,
+            pool_size=1,
+            max_overflow=0,
+        )
+
+    async def write(self, entries: List[Dict[str, Any]]):
+        async with self.engine.begin() as conn:
+            await conn.execute(insert(QueryJournalEntry), entries)
+
+    async def close(self):
+        if self.engine:
+            await self.engine.dispose()
+
+
+class QueryJournal:
+    """Ring buffer of finished queries flushed in batches by a background task.
+
+    ``record`` only appends to an in-memory deque, so the request path never
+    waits for I/O. When the buffer is full the oldest entries are dropped.
+    """
+
+    def __init__(self):
+        self.batch_size = settings.JOURNAL_BATCH_SIZE
+        self.flush_interval = settings.JOURNAL_FLUSH_INTERVAL
+        self.buffer: Deque[Dict[str, Any]] = deque(
+            maxlen=settings.JOURNAL_BUFFER_SIZE
+        )
+        self.dropped = 0
+        self.backend = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _make_backend(self):
+        if settings.JOURNAL_BACKEND == 'file':
+            return FileJournalBackend(settings.JOURNAL_PATH)
+        if settings.JOURNAL_BACKEND == 'postgres':
+            return PostgresJournalBackend(settings.JOURNAL_DATABASE_URL)
+        return None
+
+    def record(self, trace: Trace):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(trace_to_entry(trace))
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        while self.buffer:
+            batch = [
+                self.buffer.popleft()
+                for _ in range(min(self.batch_size, len(self.buffer)))
+            ]
+            try:
+                await self.backend.write(batch)
+            except Exception as e:
+                logger.error(f'Journal flush error ({len(batch)} lost): {e}')
+                return
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self):
+        self.backend = self._make_backend()
+        if self.backend is None:
+            logger.info('Query journal disabled')
+            return
+        await self.backend.open()
+        add_listener(self.record)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f'Query journal writing to {settings.JOURNAL_BACKEND}')
+
+    async def stop(self):
+        if self._task is None:
+            return
+        remove_listener(self.record)
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+        await self.backend.close()
+        if self.dropped:
+            logger.warning(f'Query journal dropped {self.dropped} entries')
+
+
+query_journal = QueryJournal()
@@ -1,10 +1,12 @@
+import asyncio
 import logging
 import re
-
-from ollama import AsyncClient
-from sqlglot import exp, parse_one
+from typing import List, Optional
 
 from app.config import settings
+from app.const import QUERYABLE_TABLES
+from app.metrics import llm_completion_tokens, llm_prompt_tokens
+from app.tracing import set_attribute, span
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +47,29 @@ CREATE INDEX idx_video_snapshots_video_created ON video_snapshots(video_id, crea
 '''  # noqa: E501
 
 
+SQL_RULES = '''Important rules:
+- Return ONLY a valid PostgreSQL SELECT query
+- The query must return a single number
+- Use COALESCE(SUM(...), 0) or COALESCE(COUNT(...), 0) for NULL safety
+- For date filtering use: DATE(created_at) = 'YYYY-MM-DD'
+- creator_id and video_id are VARCHAR, use single quotes
+- Use "videos" table for aggregated statistics
+- Use "video_snapshots" table for growth/delta queries
+'''
+
+
+def canonical_sql(sql: str) -> Optional[str]:
+    """SQL regenerated from its parsed AST, so formatting does not matter."""
+    from sqlglot import parse_one
+
+    try:
+        return parse_one(sql, read='postgres').sql(
+            dialect='postgres', normalize=True
+        )
+    except Exception:
+        return None
+
+
 class LLMProcessor:
     """Process natural language queries using Ollama + qwen3-coder."""
 
@@ -52,11 +77,43 @@ class LLMProcessor:
         self.model = settings.OLLAMA_MODEL
         self.base_url = settings.OLLAMA_BASE_URL
         self.headers = {'Authorization': f'Bearer {settings.OLLAMA_API_KEY}'}
-        self.client = AsyncClient(
-            host=self.base_url,
-            headers=self.headers
-        )
-        logger.info(f'Using Ollama at {self.base_url} with model {self.model}')
+        self._client = None
+
+    @property
+    def client(self):
+        """Ollama client, created on first use to keep imports cheap."""
+        if self._client is None:
+            from ollama import AsyncClient
+
+            self._client = AsyncClient(
+                host=self.base_url,
+                headers=self.headers
+            )
+            logger.info(
+                f'Using Ollama at {self.base_url} with model {self.model}'
+            )
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    async def prewarm(self, timeout: float):
+        """Open the Ollama connection and load the model ahead of users.
+
+        An empty prompt makes Ollama load the model without generating.
+        Also parses a query once so sqlglot and its dialect are imported.
+        """
+        self.validate_sql('SELECT 1;')
+        if timeout <= 0:
+            return
+        try:
+            await asyncio.wait_for(
+                self.client.generate(model=self.model, prompt=''),
+                timeout=timeout
+            )
+        except Exception as e:
+            logger.warning(f'LLM prewarm failed: {e}')
 
     def _translate_russian_dates(self, query: str) -> str:
         months = {
@@ -72,6 +129,43 @@ class LLMProcessor:
             result = re.sub(pattern, r'\2-' + num + r'-\1', result)
         return result
 
+    def split_questions(self, text: str) -> List[str]:
+        """Split a message into separate questions.
+
+        A new question starts at a numbered or bulleted line, after a line
+        ending with a question mark, and after a blank line; other lines
+        continue the question above, so a question wrapped over several
+        lines stays whole. Several questions on one line are split after
+        each question mark. Callers cap the count at
+        ``MAX_BATCH_QUESTIONS``.
+        """
+        blocks: List[List[str]] = []
+        current: List[str] = []
+        for line in text.splitlines():
+            line = line.strip()
+            starts_item = re.match(r'(?:\d+[.)]|[-•*])\s+', line)
+            if current and (
+                not line or starts_item or current[-1].endswith('?')
+            ):
+                blocks.append(current)
+                current = []
+            if line:
+                current.append(
+                    re.sub(r'^(?:\d+[.)]|[-•*])\s+', '', line)
+                )
+        if current:
+            blocks.append(current)
+        questions = []
+        for block in blocks:
+            question = ' '.join(block)
+            parts = [question]
+            if question.count('?') > 1:
+                parts = re.split(r'(?<=\?)\s+', question)
+            questions.extend(
+                part.strip() for part in parts if re.search(r'\w', part)
+            )
+        return questions
+
     def _build_prompt(self, user_query: str) -> str:
         query_translated = self._translate_russian_dates(user_query)
 
@@ -85,14 +179,28 @@ Generate a SQL query to answer this question: `{query_translated}`
 Database schema:
 {DATABASE_SCHEMA}
 
-Important rules:
-- Return ONLY a valid PostgreSQL SELECT query
-- The query must return a single number
-- Use COALESCE(SUM(...), 0) or COALESCE(COUNT(...), 0) for NULL safety
-- For date filtering use: DATE(created_at) = 'YYYY-MM-DD'
-- creator_id and video_id are VARCHAR, use single quotes
-- Use "videos" table for aggregated statistics
-- Use "video_snapshots" table for growth/delta queries
+{SQL_RULES}
+### Response:
+'''  # noqa: E501
+        return prompt
+
+    def _build_batch_prompt(self, questions: List[str]) -> str:
+        numbered = '\n'.join(
+            f'{i}. `{self._translate_russian_dates(question)}`'
+            for i, question in enumerate(questions, 1)
+        )
+        prompt = f'''
+### Instruction:
+Your task is to generate valid PostgreSQL queries to answer each of the given questions based on the provided database schema.
+
+### Input:
+Generate one SQL query for each of these {len(questions)} questions:
+{numbered}
+
+Database schema:
+{DATABASE_SCHEMA}
+
+{SQL_RULES}- Answer every question, in order, each query preceded by a line `-- N` with its number
 
 ### Response:
 '''  # noqa: E501
@@ -110,7 +218,24 @@ Important rules:
         cleaned = ' '.join(match.group(1).split())
         return cleaned.rstrip(';') + ';'
 
+    def _parse_batch_response(
+        self, text: str, count: int
+    ) -> List[Optional[str]]:
+        """Validated SQL per question, ``None`` where it is missing or bad."""
+        statements: List[Optional[str]] = [None] * count
+        parts = re.split(r'^\s*--\s*(\d+)\.?\s*$', text, flags=re.MULTILINE)
+        for number, body in zip(parts[1::2], parts[2::2]):
+            index = int(number) - 1
+            if not 0 <= index < count:
+                continue
+            sql = self._clean_sql_response(body)
+            if sql and self.validate_sql(sql):
+                statements[index] = sql
+        return statements
+
     def validate_sql(self, sql: str) -> bool:
+        from sqlglot import exp, parse_one
+
         try:
             expr = parse_one(sql, read='postgres')
         except Exception:
@@ -131,28 +256,85 @@ Important rules:
         for node in expr.walk():
             if isinstance(node, forbidden):
                 return False
+        # Only the analytics tables, plus the query's own CTEs
+        ctes = {cte.alias_or_name for cte in expr.find_all(exp.CTE)}
+        for table in expr.find_all(exp.Table):
+            if not isinstance(table.this, exp.Identifier):
+                return False
+            if table.db not in ('', 'public') or table.catalog:
+                return False
+            if table.name not in QUERYABLE_TABLES and table.name not in ctes:
+                return False
         return True
 
-    async def text_to_sql(self, user_query: str) -> str:
-        """Convert natural language query to SQL using Ollama + SQLCoder."""
-        logger.info(f'Processing query: {user_query}')
+    async def text_to_sql(
+        self, user_query: str, timeout: Optional[float] = None
+    ) -> str:
+        """Convert natural language query to SQL using Ollama + SQLCoder.
+
+        ``timeout`` bounds the LLM call in seconds; the request is aborted
+        with ``asyncio.TimeoutError`` when it is exceeded.
+        """
+        logger.debug(f'Processing query: {user_query}')
         try:
             prompt = self._build_prompt(user_query)
-            logger.info(f'Sending request to Ollama ({self.model})...')
-            response = await self.client.generate(
-                model=self.model,
-                prompt=prompt,
-                stream=False
-            )
+            logger.debug(f'Sending request to Ollama ({self.model})...')
+            with span('llm', model=self.model):
+                response = await asyncio.wait_for(
+                    self.client.generate(
+                        model=self.model,
+                        prompt=prompt,
+                        stream=False
+                    ),
+                    timeout=timeout
+                )
+            prompt_tokens = response.get('prompt_eval_count') or 0
+            completion_tokens = response.get('eval_count') or 0
+            llm_prompt_tokens.inc(prompt_tokens)
+            llm_completion_tokens.inc(completion_tokens)
+            set_attribute('llm_tokens', prompt_tokens + completion_tokens)
             raw_text = response.get('response', '')
-            sql = self._clean_sql_response(raw_text)
-            if not self.validate_sql(sql):
+            with span('validation'):
+                sql = self._clean_sql_response(raw_text)
+                valid = self.validate_sql(sql)
+            if not valid:
                 raise ValueError('Generated SQL query failed validation')
-            logger.info(f'Generated SQL: {sql}')
+            set_attribute('sql', sql)
+            logger.debug(f'Generated SQL: {sql}')
             return sql
         except Exception as e:
             logger.error(f'Error processing query: {e}', exc_info=True)
             raise
 
+    async def text_to_sql_batch(
+        self, questions: List[str], timeout: Optional[float] = None
+    ) -> List[Optional[str]]:
+        """Generate SQL for several questions in a single LLM call.
+
+        Returns one entry per question; questions whose SQL is missing or
+        fails validation get ``None`` instead of failing the whole batch.
+        """
+        prompt = self._build_batch_prompt(questions)
+        with span('llm', model=self.model, questions=len(questions)):
+            response = await asyncio.wait_for(
+                self.client.generate(
+                    model=self.model,
+                    prompt=prompt,
+                    stream=False
+                ),
+                timeout=timeout
+            )
+        prompt_tokens = response.get('prompt_eval_count') or 0
+        completion_tokens = response.get('eval_count') or 0
+        llm_prompt_tokens.inc(prompt_tokens)
+        llm_completion_tokens.inc(completion_tokens)
+        set_attribute('llm_tokens', prompt_tokens + completion_tokens)
+        with span('validation'):
+            statements = self._parse_batch_response(
+                response.get('response', ''), len(questions)
+            )
+        logger.debug(f'Generated batch SQL: {statements}')
+        return statements
+
 
 llm_processor = LLMProcessor()
@@ -0,0 +1,180 @@
+import logging
+from typing import Optional
+
+from aiohttp import web
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+STAGES = (
+    'queue', 'cache_lookup', 'llm', 'validation', 'db', 'speculative_db',
+    'send', 'total',
+)
+QUERY_OUTCOMES = (
+    'cached', 'answered', 'timeout', 'invalid', 'error', 'cancelled'
+)
+FAILURE_REASONS = ('validation', 'execution', 'timeout')
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)
+
+STAGE_DURATION = Histogram(
+    'bot_stage_duration_seconds',
+    'Duration of each process_query stage',
+    ['stage'],
+    buckets=LATENCY_BUCKETS,
+)
+QUERIES = Counter(
+    'bot_queries_total', 'Processed user queries by outcome', ['outcome']
+)
+CACHE_REQUESTS = Counter(
+    'bot_cache_requests_total', 'Result cache lookups', ['result']
+)
+LLM_TOKENS = Counter(
+    'bot_llm_tokens_total', 'Tokens consumed by the LLM', ['kind']
+)
+NEGATIVE_CACHE_HITS = Counter(
+    'bot_negative_cache_hits_total',
+    'Known failures answered from the negative cache', ['kind', 'reason']
+)
+LLM_SAVED_TOKENS = Counter(
+    'bot_llm_saved_tokens_total',
+    'LLM tokens not spent on questions known to fail', ['reason']
+)
+SPECULATIONS = Counter(
+    'bot_speculations_total',
+    'Speculative SQL runs by whether the LLM agreed', ['result']
+)
+
+# Label children are resolved once so the hot path skips label lookups
+stage_duration = {stage: STAGE_DURATION.labels(stage) for stage in STAGES}
+queries = {outcome: QUERIES.labels(outcome) for outcome in QUERY_OUTCOMES}
+cache_hits = CACHE_REQUESTS.labels('hit')
+cache_misses = CACHE_REQUESTS.labels('miss')
+cache_errors = CACHE_REQUESTS.labels('error')
+llm_prompt_tokens = LLM_TOKENS.labels('prompt')
+llm_completion_tokens = LLM_TOKENS.labels('completion')
+negative_question_hits = {
+    reason: NEGATIVE_CACHE_HITS.labels('question', reason)
+    for reason in FAILURE_REASONS
+}
+llm_saved_tokens = {
+    reason: LLM_SAVED_TOKENS.labels(reason) for reason in FAILURE_REASONS
+}
+negative_sql_hits = {
+    reason: NEGATIVE_CACHE_HITS.labels('sql', reason)
+    for reason in FAILURE_REASONS
+}
+speculation_hits = SPECULATIONS.labels('hit')
+speculation_misses = SPECULATIONS.labels('miss')
+
+
+class RuntimeCollector:
+    """Gauges read at scrape time, so they cost nothing per request."""
+
+    def describe(self):
+        # Skip the registration-time collect(): db and rate_limit import us
+        return []
+
+    def collect(self):
+        from app.db import db
+        from app.rate_limit import fair_scheduler, rate_limiter
+
+        pool = db.engine.pool if db.engine is not None else None
+        if pool is not None and hasattr(pool, 'checkedout'):
+            connections = GaugeMetricFamily(
+                'bot_db_pool_connections',
+                'Connections in the database pool by state',
+                labels=['state'],
+            )
+            connections.add_metric(['checked_out'], pool.checkedout())
+            connections.add_metric(['checked_in'], pool.checkedin())
+            connections.add_metric(['overflow'], max(0, pool.overflow()))
+            yield connections
+            yield GaugeMetricFamily(
+                'bot_db_pool_size', 'Configured pool size', value=pool.size()
+            )
+        limits = CounterMetricFamily(
+            'bot_rate_limit_decisions',
+            'Rate limiter decisions taken by this process',
+            labels=['verdict'],
+        )
+        for verdict, count in rate_limiter.local_counters.items():
+            limits.add_metric([verdict], count)
+        yield limits
+        shared_limits = CounterMetricFamily(
+            'bot_rate_limit_shared_decisions',
+            'Rate limiter decisions taken in Redis by all replicas',
+            labels=['verdict'],
+        )
+        for verdict, count in rate_limiter.shared_counters.items():
+            shared_limits.add_metric([verdict], count)
+        yield shared_limits
+        scheduler = GaugeMetricFamily(
+            'bot_scheduler_slots',
+            'Fair scheduler query slots',
+            labels=['state'],
+        )
+        scheduler.add_metric(['active'], fair_scheduler.active)
+        scheduler.add_metric(['queued'], fair_scheduler.queued)
+        yield scheduler
+
+
+REGISTRY.register(RuntimeCollector())
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        body=generate_latest(REGISTRY),
+        headers={'Content-Type': CONTENT_TYPE_LATEST},
+    )
+
+
+class MetricsServer:
+    """Prometheus endpoint served from the bot's own event loop.
+
+    Also serves ``/ready``, which answers 503 until startup has finished
+    prewarming connections.
+    """
+
+    def __init__(self):
+        self.runner: Optional[web.AppRunner] = None
+        self.ready = False
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        if not self.ready:
+            return web.json_response({'status': 'starting'}, status=503)
+        return web.json_response({'status': 'ready'})
+
+    async def start(self, port: Optional[int] = None):
+        port = settings.METRICS_PORT if port is None else port
+        if not port:
+            logger.info('Metrics endpoint disabled')
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', handle_metrics)
+        app.router.add_get('/ready', self.handle_ready)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, settings.METRICS_HOST, port)
+        await site.start()
+        logger.info(f'Metrics endpoint listening on port {port}')
+
+    async def stop(self):
+        self.ready = False
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+metrics_server = MetricsServer()
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message
+
+from app.config import settings
+from app.const import FAILURE_REPLY_TIMEOUT
+from app.metrics import queries
+from app.rate_limit import (
+    ALLOWED,
+    FairScheduler,
+    RateLimiter,
+    fair_scheduler,
+    rate_limiter,
+)
+from app.tasks import Deadline, chat_tasks
+from app.tracing import span
+
+logger = logging.getLogger(__name__)
+
+MAX_NOTIFIED_USERS = 10000
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """Throttle and fairly schedule handlers flagged with ``rate_limit``.
+
+    Messages over the per-user or per-chat token budget are dropped; the
+    sender is told about it at most once per ``RATE_LIMIT_NOTIFY_INTERVAL``.
+    Accepted messages wait for a slot in the fair scheduler. The request
+    deadline starts before that wait and reaches the handler as
+    ``deadline``; the chat is tracked from then on too, so a newer message
+    cancels a query that is still queued. The wait is timed as the
+    ``queue`` stage and reaches the handler's trace through ``queued_at``.
+    """
+
+    def __init__(
+        self,
+        limiter: RateLimiter = rate_limiter,
+        scheduler: FairScheduler = fair_scheduler,
+    ):
+        self.limiter = limiter
+        self.scheduler = scheduler
+        self.notified_at: Dict[int, float] = {}
+
+    def _should_notify(self, user_id: int) -> bool:
+        now = time.monotonic()
+        interval = settings.RATE_LIMIT_NOTIFY_INTERVAL
+        last = self.notified_at.get(user_id)
+        if last is not None and now - last < interval:
+            return False
+        if len(self.notified_at) >= MAX_NOTIFIED_USERS:
+            self.notified_at = {
+                uid: ts for uid, ts in self.notified_at.items()
+                if now - ts < interval
+            }
+        self.notified_at[user_id] = now
+        return True
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not get_flag(data, 'rate_limit'):
+            return await handler(event, data)
+        user_id = event.from_user.id if event.from_user else event.chat.id
+        verdict = await self.limiter.check(user_id, event.chat.id)
+        if verdict != ALLOWED:
+            logger.warning(f'Rate limited user {user_id} (verdict={verdict})')
+            if self._should_notify(user_id):
+                async with asyncio.timeout(FAILURE_REPLY_TIMEOUT):
+                    await event.answer(
+                        'Слишком много запросов.\n'
+                        'Подождите немного и попробуйте снова.'
+                    )
+            return None
+        deadline = Deadline(settings.REQUEST_TIMEOUT)
+        with chat_tasks.track(event.chat.id, event.message_id):
+            async with AsyncExitStack() as stack:
+                queued_at = time.perf_counter()
+                try:
+                    with span('queue'):
+                        async with asyncio.timeout(deadline.remaining()):
+                            await stack.enter_async_context(
+                                self.scheduler.slot(user_id)
+                            )
+                except asyncio.TimeoutError:
+                    queries['timeout'].inc()
+                    logger.warning(f'No query slot for user {user_id} '
+                                   f'within {settings.REQUEST_TIMEOUT}s')
+                    async with asyncio.timeout(FAILURE_REPLY_TIMEOUT):
+                        await event.answer(
+                            'Сервер перегружен.\n'
+                            'Попробуйте еще раз через минуту.'
+                        )
+                    return None
+                data['deadline'] = deadline
+                data['queued_at'] = queued_at
+                return await handler(event, data)
@@ -1,11 +1,21 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
-from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, String
+from sqlalchemy import (
+    BigInteger, DateTime, Float, ForeignKey, Index, String, Text
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
-from app.const import DEFAULT_ZERO, MAX_CREATOR_ID, MAX_SNAP_ID, MAX_VID_ID
+from app.const import (
+    DEFAULT_ZERO,
+    MAX_CREATOR_ID,
+    MAX_OUTCOME,
+    MAX_SNAP_ID,
+    MAX_TRACE_ID,
+    MAX_VID_ID,
+)
 
 
 class Base(DeclarativeBase):
@@ -99,3 +109,26 @@ class VideoSnapshot(Base, CountMixin, TimeStampMixin):
 
     def __repr__(self):
         return f'VideoSnapshot(id={self.id}, video_id={self.video_id})'
+
+
+class QueryJournalEntry(Base):
+    __tablename__ = 'query_journal'
+
+    id: Mapped[int] = mapped_column(
+        BigInteger, primary_key=True, autoincrement=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+    trace_id: Mapped[str] = mapped_column(String(MAX_TRACE_ID), nullable=False)
+    user_id: Mapped[Optional[int]] = mapped_column(BigInteger)
+    chat_id: Mapped[Optional[int]] = mapped_column(BigInteger)
+    question: Mapped[str] = mapped_column(Text, nullable=False)
+    sql: Mapped[Optional[str]] = mapped_column(Text)
+    result: Mapped[Optional[int]] = mapped_column(BigInteger)
+    outcome: Mapped[str] = mapped_column(String(MAX_OUTCOME), nullable=False)
+    latency_ms: Mapped[float] = mapped_column(Float, nullable=False)
+    stages: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+
+    def __repr__(self):
+        return f'QueryJournalEntry(id={self.id}, outcome={self.outcome})'
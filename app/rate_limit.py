@@ -0,0 +1,263 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.cache import cache
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_KEY = 'ratelimit:counters'
+MAX_LOCAL_BUCKETS = 10000
+COUNTERS_REFRESH_INTERVAL = 15
+
+# Atomically refill and take one token from both the user and the chat
+# bucket. Returns 0 when allowed, 1 when the user bucket is empty and 2
+# when the chat bucket is empty. Counters are kept in the same round trip.
+TOKEN_BUCKET_SCRIPT = '''
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+
+local function refill(key, capacity, rate)
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    return math.min(capacity, tokens + (now - ts) * rate)
+end
+
+local user_capacity = tonumber(ARGV[1])
+local user_rate = tonumber(ARGV[2])
+local chat_capacity = tonumber(ARGV[3])
+local chat_rate = tonumber(ARGV[4])
+local user_tokens = refill(KEYS[1], user_capacity, user_rate)
+local chat_tokens = refill(KEYS[2], chat_capacity, chat_rate)
+
+local verdict = 0
+if user_tokens < 1 then
+    verdict = 1
+    redis.call('HINCRBY', KEYS[3], 'throttled_user', 1)
+elseif chat_tokens < 1 then
+    verdict = 2
+    redis.call('HINCRBY', KEYS[3], 'throttled_chat', 1)
+else
+    user_tokens = user_tokens - 1
+    chat_tokens = chat_tokens - 1
+    redis.call('HINCRBY', KEYS[3], 'allowed', 1)
+end
+redis.call('HSET', KEYS[1], 'tokens', user_tokens, 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', chat_tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+return verdict
+'''
+
+ALLOWED = 0
+THROTTLED_USER = 1
+THROTTLED_CHAT = 2
+
+
+class TokenBucket:
+    """In-process token bucket used when Redis is unavailable."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+
+class RateLimiter:
+    """Token-bucket limits per user and per chat.
+
+    Buckets live in Redis so every replica shares them; without Redis the
+    limiter falls back to per-process buckets. The shared decision counters
+    are copied from Redis in the background, so metric scrapes never wait
+    on Redis.
+    """
+
+    def __init__(self):
+        self.user_capacity = settings.RATE_LIMIT_USER_CAPACITY
+        self.user_rate = settings.RATE_LIMIT_USER_RATE
+        self.chat_capacity = settings.RATE_LIMIT_CHAT_CAPACITY
+        self.chat_rate = settings.RATE_LIMIT_CHAT_RATE
+        self.local_buckets: Dict[str, TokenBucket] = {}
+        self.local_counters: Counter = Counter()
+        self.shared_counters: Dict[str, int] = {}
+        self._script = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _ttl(capacity: float, rate: float) -> int:
+        """Seconds until an idle bucket is full again and can be dropped."""
+        return math.ceil(capacity / rate) + 1
+
+    def _prune_local(self, now: float):
+        """Drop buckets that have refilled completely."""
+        for key, bucket in list(self.local_buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self.local_buckets[key]
+
+    def _local_bucket(self, key: str, capacity: float,
+                      rate: float) -> TokenBucket:
+        bucket = self.local_buckets.get(key)
+        if bucket is None:
+            if len(self.local_buckets) >= MAX_LOCAL_BUCKETS:
+                self._prune_local(time.monotonic())
+            bucket = self.local_buckets[key] = TokenBucket(capacity, rate)
+        return bucket
+
+    def _check_local(self, user_id: int, chat_id: int) -> int:
+        now = time.monotonic()
+        user = self._local_bucket(
+            f'user:{user_id}', self.user_capacity, self.user_rate
+        )
+        chat = self._local_bucket(
+            f'chat:{chat_id}', self.chat_capacity, self.chat_rate
+        )
+        user.refill(now)
+        chat.refill(now)
+        if user.tokens < 1:
+            self.local_counters['throttled_user'] += 1
+            return THROTTLED_USER
+        if chat.tokens < 1:
+            self.local_counters['throttled_chat'] += 1
+            return THROTTLED_CHAT
+        user.tokens -= 1
+        chat.tokens -= 1
+        self.local_counters['allowed'] += 1
+        return ALLOWED
+
+    async def check(self, user_id: int, chat_id: int) -> int:
+        """Take a token for the user and the chat, return the verdict."""
+        if not cache.client:
+            return self._check_local(user_id, chat_id)
+        try:
+            if self._script is None:
+                self._script = cache.client.register_script(
+                    TOKEN_BUCKET_SCRIPT
+                )
+            verdict = await self._script(
+                keys=[
+                    f'ratelimit:user:{user_id}',
+                    f'ratelimit:chat:{chat_id}',
+                    COUNTERS_KEY,
+                ],
+                args=[
+                    self.user_capacity,
+                    self.user_rate,
+                    self.chat_capacity,
+                    self.chat_rate,
+                    self._ttl(self.user_capacity, self.user_rate),
+                    self._ttl(self.chat_capacity, self.chat_rate),
+                ]
+            )
+            return int(verdict)
+        except Exception as e:
+            logger.error(f'Rate limit check error: {e}')
+            return self._check_local(user_id, chat_id)
+
+    async def refresh_counters(self):
+        """Copy the decision counters shared by all replicas from Redis."""
+        try:
+            shared = await cache.client.hgetall(COUNTERS_KEY)
+            self.shared_counters = {k: int(v) for k, v in shared.items()}
+        except Exception as e:
+            logger.error(f'Rate limit counters error: {e}')
+
+    async def _refresh_loop(self):
+        while True:
+            await self.refresh_counters()
+            await asyncio.sleep(COUNTERS_REFRESH_INTERVAL)
+
+    async def start(self):
+        if not cache.client:
+            return
+        self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresher is None:
+            return
+        self._refresher.cancel()
+        await asyncio.gather(self._refresher, return_exceptions=True)
+        self._refresher = None
+
+
+class FairScheduler:
+    """Weighted fair queueing of query slots between users.
+
+    Each request gets a virtual finish tag of
+    ``max(virtual_time, user's last tag) + cost / weight``; free slots go
+    to the smallest tag, so a user with a long backlog is interleaved
+    with everyone else instead of starving them.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.active = 0
+        self.virtual_time = 0.0
+        self.finish_tags: Dict[int, float] = {}
+        self.waiters: List[Tuple[float, int, asyncio.Future]] = []
+        self._sequence = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self.waiters if not future.done())
+
+    def _tag(self, user_id: int, weight: float, cost: float) -> float:
+        start = max(self.virtual_time, self.finish_tags.get(user_id, 0.0))
+        tag = start + cost / weight
+        self.finish_tags[user_id] = tag
+        return tag
+
+    def _release(self):
+        while self.waiters:
+            tag, _, future = heapq.heappop(self.waiters)
+            if future.done():
+                continue
+            # Hand the slot over directly, active count stays the same
+            self.virtual_time = tag
+            future.set_result(None)
+            return
+        self.active -= 1
+        if self.active == 0:
+            # Idle scheduler: old tags carry no information any more
+            self.finish_tags.clear()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, weight: float = 1.0,
+                   cost: float = 1.0) -> AsyncIterator[None]:
+        tag = self._tag(user_id, weight, cost)
+        if self.active < self.slots and not self.queued:
+            self.active += 1
+            self.virtual_time = tag
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._sequence += 1
+            heapq.heappush(self.waiters, (tag, self._sequence, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release()
+                future.cancel()
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+
+rate_limiter = RateLimiter()
+fair_scheduler = FairScheduler(settings.MAX_CONCURRENT_QUERIES)
+
@@ -0,0 +1,171 @@
+import asyncio
+import difflib
+import logging
+import re
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+
+from app.cache import cache, normalize_query
+from app.config import settings
+from app.db import db
+from app.llm_processor import canonical_sql, llm_processor
+from app.metrics import speculation_hits, speculation_misses
+from app.tasks import Deadline
+
+logger = logging.getLogger(__name__)
+
+# Dates (after translation), creator ids and numbers vary between questions
+# that otherwise share the same SQL
+LITERAL_PATTERN = re.compile(
+    r'(\d{4})-(\d{2})-(\d{1,2})\b|\b[0-9a-f]{32}\b|\d+'
+)
+
+
+def question_template(question: str) -> Tuple[str, List[str]]:
+    """Question with literals replaced by placeholders, and the literals."""
+    text = llm_processor._translate_russian_dates(normalize_query(question))
+    literals = []
+
+    def placeholder(match: re.Match) -> str:
+        if match.group(1):
+            year, month, day = match.groups()
+            literals.append(f'{year}-{month}-{int(day):02d}')
+        else:
+            literals.append(match.group(0))
+        return '#'
+
+    return LITERAL_PATTERN.sub(placeholder, text), literals
+
+
+def substitute_literals(sql: str, old: List[str],
+                        new: List[str]) -> Optional[str]:
+    """Swap a past question's literals for new ones inside its SQL.
+
+    Returns ``None`` when the mapping is ambiguous or an old literal that
+    changed cannot be found in the SQL.
+    """
+    if len(old) != len(new):
+        return None
+    mapping = {}
+    for before, after in zip(old, new):
+        if mapping.setdefault(before, after) != after:
+            return None
+    changed = {k: v for k, v in mapping.items() if k != v}
+    if not changed:
+        return sql
+    pattern = re.compile(
+        r'(?<![\w-])(' + '|'.join(map(re.escape, changed)) + r')(?![\w-])'
+    )
+    if {m.group(1) for m in pattern.finditer(sql)} != set(changed):
+        return None
+    return pattern.sub(lambda m: changed[m.group(1)], sql)
+
+
+class Speculation:
+    """Candidate SQL running on the read pool while the LLM works."""
+
+    def __init__(self, sql: Optional[str] = None,
+                 task: Optional[asyncio.Task] = None):
+        self.sql = sql
+        self.canonical = canonical_sql(sql) if sql else None
+        self.task = task
+
+    async def result_for(self, sql: str) -> Optional[int]:
+        """Precomputed result if ``sql`` is equivalent to the candidate."""
+        if self.task is None:
+            return None
+        if canonical_sql(sql) == self.canonical:
+            speculation_hits.inc()
+            return await self.task
+        speculation_misses.inc()
+        self.cancel()
+        return None
+
+    def cancel(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+
+class SqlSpeculator:
+    """Predict SQL for a question from questions answered before.
+
+    Questions are indexed by template, i.e. with dates, ids and numbers
+    replaced by placeholders. A question with a known template reuses that
+    SQL with its own literals; otherwise the most similar template above
+    ``SPECULATION_MIN_SIMILARITY`` is tried.
+    """
+
+    def __init__(self):
+        self.size = settings.SPECULATION_INDEX_SIZE
+        self.min_similarity = settings.SPECULATION_MIN_SIMILARITY
+        self.index: OrderedDict[str, Tuple[List[str], str]] = OrderedDict()
+
+    def remember(self, question: str, sql: str):
+        if self.size <= 0:
+            return
+        template, literals = question_template(question)
+        self.index[template] = (literals, sql)
+        self.index.move_to_end(template)
+        while len(self.index) > self.size:
+            self.index.popitem(last=False)
+
+    async def load(self):
+        """Seed the index with the most popular questions and their SQL."""
+        if self.size <= 0:
+            return
+        questions = await cache.top_queries(self.size)
+        statements = await asyncio.gather(
+            *(cache.get_sql(question) for question in questions)
+        )
+        for question, sql in zip(reversed(questions), reversed(statements)):
+            if sql is not None:
+                self.remember(question, sql)
+        logger.info(f'Speculation index seeded with {len(self.index)} SQL')
+
+    def predict(self, question: str) -> Optional[str]:
+        if not self.index:
+            return None
+        template, literals = question_template(question)
+        match = self.index.get(template)
+        if match is None:
+            close = difflib.get_close_matches(
+                template, self.index, n=1, cutoff=self.min_similarity
+            )
+            if not close:
+                return None
+            match = self.index[close[0]]
+        old_literals, sql = match
+        candidate = substitute_literals(sql, old_literals, literals)
+        if candidate is None or not llm_processor.validate_sql(candidate):
+            return None
+        return candidate
+
+    @asynccontextmanager
+    async def speculate(self, question: str, deadline: Deadline):
+        """Run the predicted SQL for ``question`` until the block exits.
+
+        Unless ``result_for`` consumed it, the speculative query is
+        cancelled on exit, including when the LLM call fails. It is timed
+        as ``speculative_db`` so it never counts as the request's ``db``
+        stage.
+        """
+        sql = self.predict(question)
+        if sql is None:
+            speculation = Speculation()
+        else:
+            speculation = Speculation(sql, asyncio.create_task(
+                db.execute_raw_query(
+                    sql, timeout_ms=deadline.remaining_ms(),
+                    stage='speculative_db'
+                )
+            ))
+        try:
+            yield speculation
+        finally:
+            speculation.cancel()
+            if speculation.task is not None:
+                await asyncio.gather(speculation.task, return_exceptions=True)
+
+
+sql_speculator = SqlSpeculator()
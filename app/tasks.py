@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Deadline:
+    """End-to-end time budget shared by all stages of a request."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline. Raises if already expired."""
+        left = self.expires_at - time.monotonic()
+        if left <= 0:
+            raise asyncio.TimeoutError('Request deadline exceeded')
+        return left
+
+    def remaining_ms(self) -> int:
+        """Remaining budget in milliseconds, for statement_timeout."""
+        return max(1, int(self.remaining() * 1000))
+
+    def remaining_seconds(self) -> int:
+        """Remaining budget rounded up to whole seconds, for HTTP calls."""
+        return max(1, math.ceil(self.remaining()))
+
+
+class ChatTaskRegistry:
+    """Track the in-flight query task per chat.
+
+    A newer message from the same chat cancels the previous task, so
+    abandoned LLM calls and SQL queries stop consuming resources. Webhook
+    workers relay newer messages handled by other processes through
+    ``cancel_older``.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[int, Tuple[asyncio.Task, int]] = {}
+
+    @contextmanager
+    def track(self, chat_id: int,
+              message_id: int = 0) -> Iterator[asyncio.Task]:
+        task = asyncio.current_task()
+        if task is None:
+            raise RuntimeError('track() must be called from a task')
+        previous = self.get(chat_id)
+        if previous is not None and previous is not task:
+            if not previous.done():
+                logger.info(f'Cancelling superseded query in chat {chat_id}')
+                previous.cancel()
+        self._tasks[chat_id] = (task, message_id)
+        try:
+            yield task
+        finally:
+            if self.get(chat_id) is task:
+                del self._tasks[chat_id]
+
+    def get(self, chat_id: int) -> Optional[asyncio.Task]:
+        entry = self._tasks.get(chat_id)
+        return entry[0] if entry is not None else None
+
+    def cancel_older(self, chat_id: int, message_id: int):
+        """Cancel the chat's task if it handles a message before this one."""
+        entry = self._tasks.get(chat_id)
+        if entry is None:
+            return
+        task, tracked_id = entry
+        if tracked_id < message_id and not task.done():
+            logger.info(f'Cancelling query in chat {chat_id} superseded '
+                        'on another worker')
+            task.cancel()
+
+    def cancel_all(self):
+        for task, _ in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+
+chat_tasks = ChatTaskRegistry()
@@ -0,0 +1,198 @@
+import asyncio
+import cProfile
+import json
+import logging
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import settings
+from app.metrics import stage_duration
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger('app.trace')
+
+_current_trace: ContextVar[Optional['Trace']] = ContextVar(
+    'current_trace', default=None
+)
+_listeners: List[Callable[['Trace'], None]] = []
+
+
+class Trace:
+    """Span timings and attributes collected for a single request."""
+
+    def __init__(self, name: str, **attributes: Any):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+
+    def add_span(self, name: str, started: float, duration: float,
+                 attributes: Dict[str, Any]):
+        span = {
+            'name': name,
+            'offset_ms': round((started - self.started) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3),
+        }
+        if attributes:
+            span.update(attributes)
+        self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'error': self.error,
+            'attributes': self.attributes,
+            'spans': self.spans,
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def add_listener(listener: Callable[[Trace], None]):
+    """Call ``listener`` with every finished trace, sampled or not.
+
+    Listeners run on the event loop and must not block.
+    """
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[Trace], None]):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def set_attribute(key: str, value: Any):
+    """Attach an attribute to the active trace, if any."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes[key] = value
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    """Time a block as a span of the active trace.
+
+    Known stages are also recorded in the Prometheus stage histogram.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        histogram = stage_duration.get(name)
+        if histogram is not None:
+            histogram.observe(duration)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, started, duration, attributes)
+
+
+class RequestProfiler:
+    """Opt-in profiler keeping profiles of requests over a threshold.
+
+    Uses pyinstrument, whose async mode follows only the profiled request's
+    task. The cProfile fallback, used when pyinstrument is missing, is
+    process-wide: its profile also holds every other coroutine that ran on
+    the loop meanwhile. Only one request is profiled at a time, picked with
+    ``PROFILE_SAMPLE_RATE``.
+    """
+
+    def __init__(self):
+        self.threshold = settings.PROFILE_SLOW_MS / 1000
+        self.sample_rate = settings.PROFILE_SAMPLE_RATE
+        self.directory = Path(settings.PROFILE_DIR)
+        self.active = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def start(self):
+        if (not self.enabled or self.active
+                or random.random() >= self.sample_rate):
+            return None
+        self.active = True
+        if PyinstrumentProfiler is not None:
+            profiler = PyinstrumentProfiler(async_mode='enabled')
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def stop(self, profiler, trace: Trace):
+        self.active = False
+        if PyinstrumentProfiler is not None:
+            profiler.stop()
+        else:
+            profiler.disable()
+        if trace.duration < self.threshold:
+            return
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(None, self._save, profiler, trace.trace_id)
+
+    def _save(self, profiler, trace_id: str):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if PyinstrumentProfiler is not None:
+            path = self.directory / f'{trace_id}.html'
+            path.write_text(profiler.output_html(), encoding='utf-8')
+        else:
+            path = self.directory / f'{trace_id}.prof'
+            profiler.dump_stats(str(path))
+        logger.info(f'Saved slow request profile to {path}')
+
+
+profiler = RequestProfiler()
+
+
+def _should_emit(trace: Trace) -> bool:
+    if trace.error is not None:
+        return True
+    if trace.duration * 1000 >= settings.TRACE_SLOW_MS:
+        return True
+    return random.random() < settings.TRACE_SAMPLE_RATE
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Trace]:
+    """Open a request-scoped trace and emit it as JSON when it ends.
+
+    Slow and failed requests are always emitted, the rest are sampled with
+    ``TRACE_SAMPLE_RATE``.
+    """
+    trace = Trace(name, **attributes)
+    token = _current_trace.set(trace)
+    request_profiler = profiler.start()
+    try:
+        yield trace
+    except BaseException as e:
+        trace.error = type(e).__name__
+        raise
+    finally:
+        trace.duration = time.perf_counter() - trace.started
+        _current_trace.reset(token)
+        if request_profiler is not None:
+            profiler.stop(request_profiler, trace)
+        for listener in _listeners:
+            listener(trace)
+        if _should_emit(trace) and trace_logger.isEnabledFor(logging.INFO):
+            trace_logger.info(
+                json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+            )
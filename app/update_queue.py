@@ -0,0 +1,147 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+from app.config import settings
+from app.const import CHAT_CANCEL_CHANNEL, CHAT_LATEST_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateQueue:
+    """Redis Stream of raw Telegram updates shared by webhook workers.
+
+    The webhook server appends updates and acknowledges Telegram right away;
+    worker processes on any host read them through a consumer group.
+    """
+
+    def __init__(self):
+        self.client: Optional[redis.Redis] = None
+        self.stream = settings.UPDATES_STREAM
+        self.group = settings.UPDATES_GROUP
+        self.maxlen = settings.UPDATES_STREAM_MAXLEN
+
+    async def connect(self):
+        self.client = redis.from_url(
+            settings.REDIS_URL,
+            encoding='utf-8',
+            decode_responses=True
+        )
+        await self.client.ping()
+        logger.info(f'Update queue connected to stream {self.stream}')
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
+            logger.info('Update queue connection closed')
+
+    def _latest_key(self, chat_id: int) -> str:
+        return f'chat_latest:{chat_id}'
+
+    @staticmethod
+    def _message_chat_id(update: Dict[str, Any]) -> Optional[int]:
+        message = update.get('message')
+        if not message:
+            return None
+        return message.get('chat', {}).get('id')
+
+    async def push(self, update: Dict[str, Any]):
+        """Append an update and remember the newest update per chat."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xadd(
+            self.stream,
+            {'update': json.dumps(update)},
+            maxlen=self.maxlen,
+            approximate=True
+        )
+        chat_id = self._message_chat_id(update)
+        if chat_id is not None:
+            pipe.set(
+                self._latest_key(chat_id),
+                update['update_id'],
+                ex=CHAT_LATEST_TTL
+            )
+        await pipe.execute()
+
+    async def ensure_group(self):
+        try:
+            await self.client.xgroup_create(
+                self.stream, self.group, id='0', mkstream=True
+            )
+            logger.info(f'Created consumer group {self.group}')
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def read(
+        self, consumer: str, count: int, block_ms: int = 5000
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        response = await self.client.xreadgroup(
+            self.group,
+            consumer,
+            {self.stream: '>'},
+            count=count,
+            block=block_ms
+        )
+        return [
+            (entry_id, json.loads(fields['update']))
+            for _, entries in response or []
+            for entry_id, fields in entries
+        ]
+
+    async def claim_stale(
+        self, consumer: str, min_idle_ms: int, count: int
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Take over updates left pending by a worker that died."""
+        _, entries, _ = await self.client.xautoclaim(
+            self.stream,
+            self.group,
+            consumer,
+            min_idle_time=min_idle_ms,
+            start_id='0-0',
+            count=count
+        )
+        return [
+            (entry_id, json.loads(fields['update']))
+            for entry_id, fields in entries
+            if fields
+        ]
+
+    async def touch(self, consumer: str, entry_ids: List[str]):
+        """Reset the idle time of updates this consumer is processing."""
+        if entry_ids:
+            await self.client.xclaim(
+                self.stream, self.group, consumer,
+                min_idle_time=0, message_ids=entry_ids, justid=True
+            )
+
+    async def ack(self, entry_id: str):
+        await self.client.xack(self.stream, self.group, entry_id)
+
+    async def is_superseded(self, update: Dict[str, Any]) -> bool:
+        """Whether a newer message from the same chat is already queued."""
+        chat_id = self._message_chat_id(update)
+        if chat_id is None:
+            return False
+        latest = await self.client.get(self._latest_key(chat_id))
+        return latest is not None and int(latest) > update['update_id']
+
+
+    async def announce(self, update: Dict[str, Any]):
+        """Broadcast that a message is being handled to all workers.
+
+        Each of them cancels its query for an older message of the chat.
+        """
+        chat_id = self._message_chat_id(update)
+        if chat_id is None:
+            return
+        await self.client.publish(CHAT_CANCEL_CHANNEL, json.dumps({
+            'chat_id': chat_id,
+            'message_id': update['message']['message_id'],
+        }))
+
+
+update_queue = UpdateQueue()
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy.exc import DBAPIError
+
+from app.cache import cache
+from app.config import settings
+from app.const import DATA_VERSION_CHANNEL, LISTEN_RETRY_MAX, WARM_LOCK_TTL
+from app.db import db, failure_reason
+from app.llm_processor import llm_processor
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmer:
+    """Recompute answers to the most popular questions in the background.
+
+    Runs on startup and whenever an ingest bumps the data version. Only one
+    process per data version does the work, guarded by a Redis lock, and
+    at most ``CACHE_WARM_CONCURRENCY`` questions are recomputed at once.
+    """
+
+    def __init__(self):
+        self.top_n = settings.CACHE_WARM_TOP_N
+        self.concurrency = settings.CACHE_WARM_CONCURRENCY
+        self._task: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def _acquire_lock(self) -> bool:
+        return bool(await cache.client.set(
+            f'warm_lock:{cache.data_version}', 1,
+            nx=True, ex=WARM_LOCK_TTL
+        ))
+
+    async def _warm_one(self, query: str,
+                        semaphore: asyncio.Semaphore) -> bool:
+        async with semaphore:
+            if await cache.get(query, count=False) is not None:
+                return False
+            # Popular questions that keep failing are not worth an LLM call
+            if await cache.get_failure(query, count=False) is not None:
+                return False
+            sql = await cache.get_sql(query)
+            if sql is None:
+                try:
+                    sql = await llm_processor.text_to_sql(
+                        query, timeout=settings.REQUEST_TIMEOUT
+                    )
+                except ValueError:
+                    await cache.set_failure(query, 'validation')
+                    raise
+            if await cache.get_sql_failure(sql, count=False) is not None:
+                return False
+            timeout_ms = int(settings.REQUEST_TIMEOUT * 1000)
+            try:
+                result = await db.execute_raw_query(
+                    sql, timeout_ms=timeout_ms
+                )
+            except (asyncio.TimeoutError, DBAPIError) as e:
+                reason = failure_reason(e, timeout_ms)
+                if reason is not None:
+                    await cache.set_failure(query, reason, sql=sql)
+                raise
+            await cache.set(query, result, sql=sql)
+            return True
+
+    async def warm(self):
+        if self.top_n <= 0 or not cache.client:
+            return
+        if not await self._acquire_lock():
+            return
+        queries = await cache.top_queries(self.top_n)
+        if not queries:
+            return
+        logger.info(f'Warming cache for {len(queries)} popular questions')
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(
+            *(self._warm_one(query, semaphore) for query in queries),
+            return_exceptions=True
+        )
+        warmed = sum(1 for r in results if r is True)
+        failed = sum(1 for r in results if isinstance(r, Exception))
+        logger.info(
+            f'Cache warming done: {warmed} recomputed, {failed} failed, '
+            f'{len(queries) - warmed - failed} cached or known to fail'
+        )
+
+    def schedule(self):
+        """Start a warming run unless one is already in progress."""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self.warm())
+
+    async def _listen(self):
+        """Follow data version bumps, resubscribing after Redis restarts.
+
+        Bumps published while disconnected are missed, so the version is
+        re-read from Redis after every (re)subscribe.
+        """
+        delay = 1
+        while True:
+            pubsub = cache.client.pubsub()
+            try:
+                await pubsub.subscribe(DATA_VERSION_CHANNEL)
+                if await cache.refresh_data_version():
+                    logger.info(f'Data version is now {cache.data_version}')
+                    self.schedule()
+                delay = 1
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    cache.data_version = int(message['data'])
+                    logger.info(f'Data version is now {cache.data_version}')
+                    self.schedule()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f'Data version listener error: {e}; '
+                    f'resubscribing in {delay}s'
+                )
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LISTEN_RETRY_MAX)
+
+    async def start(self):
+        if not cache.client:
+            return
+        self._listener = asyncio.create_task(self._listen())
+        if self.top_n > 0:
+            self.schedule()
+
+    async def stop(self):
+        for task in (self._task, self._listener):
+            if task is not None and not task.done():
+                task.cancel()
+        await asyncio.gather(
+            *(t for t in (self._task, self._listener) if t is not None),
+            return_exceptions=True
+        )
+
+
+cache_warmer = CacheWarmer()
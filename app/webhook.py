@@ -0,0 +1,104 @@
+import json
+import logging
+import multiprocessing
+from typing import List
+
+from aiohttp import web
+
+from app.bot import bot
+from app.config import settings
+from app.metrics import handle_metrics
+from app.update_queue import update_queue
+from app.worker import run_worker
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+async def handle_update(request: web.Request) -> web.Response:
+    """Queue an update and acknowledge Telegram immediately.
+
+    Processing happens in worker processes, so Telegram never waits for
+    the LLM or the database and never retries a slow update.
+    """
+    if (settings.WEBHOOK_SECRET
+            and request.headers.get(SECRET_HEADER) != settings.WEBHOOK_SECRET):
+        return web.Response(status=401)
+    try:
+        update = json.loads(await request.read())
+    except ValueError:
+        return web.Response(status=400)
+    if not isinstance(update, dict) or 'update_id' not in update:
+        return web.Response(status=400)
+    await update_queue.push(update)
+    return web.Response()
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    return web.json_response({'status': 'ok'})
+
+
+def start_workers(count: int) -> List[multiprocessing.Process]:
+    context = multiprocessing.get_context('spawn')
+    workers = []
+    for index in range(count):
+        process = context.Process(
+            target=run_worker, args=(index,), name=f'worker-{index}'
+        )
+        process.start()
+        workers.append(process)
+    logger.info(f'Started {count} worker processes')
+    return workers
+
+
+def stop_workers(workers: List[multiprocessing.Process]):
+    for process in workers:
+        process.terminate()
+    for process in workers:
+        process.join(timeout=settings.REQUEST_TIMEOUT)
+    logger.info('Worker processes stopped')
+
+
+async def on_app_startup(app: web.Application):
+    await update_queue.connect()
+    await update_queue.ensure_group()
+    if settings.WEBHOOK_URL:
+        await bot.set_webhook(
+            settings.WEBHOOK_URL.rstrip('/') + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET or None,
+        )
+        logger.info(f'Webhook set to {settings.WEBHOOK_URL}')
+    else:
+        logger.warning('WEBHOOK_URL is empty, Telegram webhook not set')
+
+
+async def on_app_cleanup(app: web.Application):
+    await update_queue.close()
+    await bot.session.close()
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_post(settings.WEBHOOK_PATH, handle_update)
+    app.router.add_get('/health', handle_health)
+    app.router.add_get('/metrics', handle_metrics)
+    app.on_startup.append(on_app_startup)
+    app.on_cleanup.append(on_app_cleanup)
+    return app
+
+
+def main():
+    workers = start_workers(settings.WEBHOOK_WORKERS)
+    try:
+        web.run_app(
+            create_app(),
+            host=settings.WEBHOOK_HOST,
+            port=settings.WEBHOOK_PORT
+        )
+    finally:
+        stop_workers(workers)
+
+
+if __name__ == '__main__':
+    main()
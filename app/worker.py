@@ -0,0 +1,173 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Any, Dict
+
+from app.bot import bot, dp, on_shutdown, on_startup
+from app.config import settings
+from app.const import (
+    CHAT_CANCEL_CHANNEL,
+    LISTEN_RETRY_MAX,
+    STALE_UPDATE_SLACK,
+)
+from app.tasks import chat_tasks
+from app.update_queue import update_queue
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateWorker:
+    """Consume queued updates and feed them into the dispatcher.
+
+    At most ``WORKER_CONCURRENCY`` updates are processed at once; the worker
+    only reads as many entries from the stream as it has free slots, so a
+    slow LLM or database backs pressure up into Redis instead of memory.
+    A message from a chat cancels the chat's older query on every worker,
+    not only on the one that handles it.
+    Updates pending for longer than twice ``REQUEST_TIMEOUT`` plus
+    ``STALE_UPDATE_SLACK`` belong to a dead worker and are reclaimed, at
+    startup and then periodically; the idle time of updates still being
+    processed is reset at the same pace, so they are never taken over.
+    """
+
+    def __init__(self, consumer: str):
+        self.consumer = consumer
+        self.concurrency = settings.WORKER_CONCURRENCY
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.stopping = asyncio.Event()
+        self.last_claim = float('-inf')
+        self.stale_idle_ms = int(
+            (2 * settings.REQUEST_TIMEOUT + STALE_UPDATE_SLACK) * 1000
+        )
+
+    async def _process(self, entry_id: str, update: Dict[str, Any]):
+        try:
+            if await update_queue.is_superseded(update):
+                logger.info(f'Skipping superseded update {entry_id}')
+                return
+            await update_queue.announce(update)
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            logger.error(f'Error handling update {entry_id}: {e}',
+                         exc_info=True)
+        finally:
+            await update_queue.ack(entry_id)
+
+    def _spawn(self, entry_id: str, update: Dict[str, Any]):
+        if entry_id in self.inflight:
+            # Reclaimed while this worker is still processing it
+            return
+        task = asyncio.create_task(self._process(entry_id, update))
+        self.inflight[entry_id] = task
+        task.add_done_callback(lambda _: self.inflight.pop(entry_id, None))
+
+    async def _claim_stale(self) -> bool:
+        """Take over stale entries if due; true if any were spawned."""
+        now = time.monotonic()
+        if now - self.last_claim < self.stale_idle_ms / 2000:
+            return False
+        self.last_claim = now
+        await update_queue.touch(self.consumer, list(self.inflight))
+        entries = await update_queue.claim_stale(
+            self.consumer, self.stale_idle_ms,
+            self.concurrency - len(self.inflight)
+        )
+        for entry_id, update in entries:
+            self._spawn(entry_id, update)
+        if entries:
+            logger.info(f'Reclaimed {len(entries)} stale updates')
+            # A full page may mean more are waiting
+            self.last_claim = float('-inf')
+        return bool(entries)
+
+    async def _listen_cancellations(self):
+        """Cancel queries superseded by messages on other workers."""
+        delay = 1
+        while True:
+            pubsub = update_queue.client.pubsub()
+            try:
+                await pubsub.subscribe(CHAT_CANCEL_CHANNEL)
+                delay = 1
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    started = json.loads(message['data'])
+                    chat_tasks.cancel_older(
+                        started['chat_id'], started['message_id']
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f'Cancellation listener error: {e}; '
+                    f'resubscribing in {delay}s'
+                )
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LISTEN_RETRY_MAX)
+
+    async def run(self):
+        await update_queue.ensure_group()
+        listener = asyncio.create_task(self._listen_cancellations())
+        try:
+            await self._consume()
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+
+    async def _consume(self):
+        logger.info(f'Worker {self.consumer} consuming updates')
+        while not self.stopping.is_set():
+            if len(self.inflight) >= self.concurrency:
+                await asyncio.wait(
+                    self.inflight.values(),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                continue
+            if await self._claim_stale():
+                continue
+            entries = await update_queue.read(
+                self.consumer, count=self.concurrency - len(self.inflight)
+            )
+            for entry_id, update in entries:
+                self._spawn(entry_id, update)
+        if self.inflight:
+            await asyncio.wait(self.inflight.values())
+
+
+async def consume(consumer: str, metrics_port: int):
+    worker = UpdateWorker(consumer)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stopping.set)
+    try:
+        await on_startup(metrics_port)
+        await update_queue.connect()
+        await worker.run()
+    except Exception as e:
+        logger.error(f'Fatal worker error: {e}', exc_info=True)
+    finally:
+        await update_queue.close()
+        await on_shutdown()
+
+
+def run_worker(index: int = 0):
+    """Entry point for a worker process."""
+    consumer = f'{socket.gethostname()}-{os.getpid()}-{index}'
+    # Each worker process exposes its own metrics on the next free port
+    metrics_port = 0
+    if settings.METRICS_PORT:
+        metrics_port = settings.METRICS_PORT + 1 + index
+    asyncio.run(consume(consumer, metrics_port))
+
+
+if __name__ == '__main__':
+    run_worker()
@@ -27,6 +27,12 @@ psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-E
     
     -- Make sure user cannot create objects
     REVOKE CREATE ON SCHEMA public FROM readonly_user;
+
+    -- Journal writer: INSERT on query_journal only, granted by the
+    -- migration that creates the privileges
+    CREATE USER journal_writer WITH PASSWORD 'journal_writer_password';
+    GRANT CONNECT ON DATABASE $POSTGRES_DB TO journal_writer;
+    GRANT USAGE ON SCHEMA public TO journal_writer;
 EOSQL
 
 echo "Readonly user created successfully!"
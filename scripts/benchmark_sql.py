@@ -0,0 +1,186 @@
+"""Benchmark representative generated SQL against the loaded dataset.
+
+Runs a fixed corpus of queries of the kind the LLM produces, reports
+latency percentiles and the plan of each query, and optionally compares
+the run with a saved baseline to flag regressions.
+
+Usage:
+    python -m scripts.benchmark_sql --iterations 20 --output bench.json
+    python -m scripts.benchmark_sql --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from app.db import db
+from scripts.stats import latency_summary
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Representative SQL as generated from the prompt in app/llm_processor.py.
+# {creator_id} and {date} are filled from the loaded data.
+QUERY_CORPUS = {
+    'count_videos': 'SELECT COUNT(*) FROM videos;',
+    'videos_over_views': (
+        'SELECT COUNT(*) FROM videos WHERE views_count > 100000;'
+    ),
+    'creator_videos': (
+        "SELECT COUNT(*) FROM videos WHERE creator_id = '{creator_id}';"
+    ),
+    'creator_total_views': (
+        'SELECT COALESCE(SUM(views_count), 0) FROM videos '
+        "WHERE creator_id = '{creator_id}';"
+    ),
+    'videos_published_on_day': (
+        "SELECT COUNT(*) FROM videos WHERE DATE(video_created_at) = '{date}';"
+    ),
+    'views_growth_on_day': (
+        'SELECT COALESCE(SUM(delta_views_count), 0) FROM video_snapshots '
+        "WHERE DATE(created_at) = '{date}';"
+    ),
+    'videos_with_new_views_on_day': (
+        'SELECT COUNT(DISTINCT video_id) FROM video_snapshots '
+        "WHERE DATE(created_at) = '{date}' AND delta_views_count > 0;"
+    ),
+    'creator_growth_on_day': (
+        'SELECT COALESCE(SUM(vs.delta_views_count), 0) '
+        'FROM video_snapshots vs JOIN videos v ON vs.video_id = v.id '
+        "WHERE v.creator_id = '{creator_id}' "
+        "AND DATE(vs.created_at) = '{date}';"
+    ),
+    'likes_growth_range': (
+        'SELECT COALESCE(SUM(delta_likes_count), 0) FROM video_snapshots '
+        "WHERE created_at >= '{date}' "
+        "AND created_at < DATE '{date}' + INTERVAL '7 days';"
+    ),
+}
+
+
+async def fetch_parameters() -> Dict[str, str]:
+    """Pick the busiest creator and day so filters hit real rows."""
+    async with db.session() as session:
+        creator = await session.execute(text(
+            'SELECT creator_id FROM videos GROUP BY creator_id '
+            'ORDER BY COUNT(*) DESC LIMIT 1'
+        ))
+        day = await session.execute(text(
+            'SELECT DATE(created_at) FROM video_snapshots '
+            'GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1'
+        ))
+        return {
+            'creator_id': creator.scalar() or '',
+            'date': str(day.scalar() or '2025-11-28'),
+        }
+
+
+async def explain(sql: str) -> Dict[str, Any]:
+    async with db.session() as session:
+        result = await session.execute(
+            text(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}')
+        )
+        plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]
+    scans = []
+
+    def walk(node: Dict[str, Any]):
+        if 'Scan' in node['Node Type']:
+            scans.append(
+                f"{node['Node Type']} on {node.get('Relation Name', '?')}"
+                + (f" using {node['Index Name']}"
+                   if 'Index Name' in node else '')
+            )
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(root['Plan'])
+    return {
+        'execution_ms': root.get('Execution Time'),
+        'planning_ms': root.get('Planning Time'),
+        'total_cost': root['Plan'].get('Total Cost'),
+        'scans': scans,
+    }
+
+
+async def benchmark(iterations: int, warmup: int) -> Dict[str, Any]:
+    db.init()
+    try:
+        params = await fetch_parameters()
+        logger.info(f'Benchmark parameters: {params}')
+        report = {'parameters': params, 'queries': {}}
+        for name, template in QUERY_CORPUS.items():
+            sql = template.format(**params)
+            for _ in range(warmup):
+                await db.execute_raw_query(sql)
+            latencies: List[float] = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                await db.execute_raw_query(sql)
+                latencies.append(time.perf_counter() - started)
+            entry = latency_summary(latencies)
+            entry['plan'] = await explain(sql)
+            report['queries'][name] = entry
+            logger.info(
+                f"{name}: p50={entry['p50_ms']}ms p99={entry['p99_ms']}ms "
+                f"scans={entry['plan']['scans']}"
+            )
+        return report
+    finally:
+        await db.close()
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Queries whose p50 grew more than ``threshold`` times."""
+    regressions = []
+    for name, entry in report['queries'].items():
+        base = baseline['queries'].get(name)
+        if not base or not base['p50_ms']:
+            continue
+        ratio = entry['p50_ms'] / base['p50_ms']
+        if ratio > threshold:
+            regressions.append(
+                f"{name}: p50 {base['p50_ms']}ms -> {entry['p50_ms']}ms "
+                f"(x{ratio:.2f}), scans {base['plan']['scans']} -> "
+                f"{entry['plan']['scans']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--baseline', help='report to compare against')
+    parser.add_argument(
+        '--threshold', type=float, default=1.5,
+        help='p50 slowdown ratio reported as a regression'
+    )
+    args = parser.parse_args()
+    report = asyncio.run(benchmark(args.iterations, args.warmup))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        logger.info(f'Report written to {args.output}')
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            logger.warning(f'Regression: {line}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
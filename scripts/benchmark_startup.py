@@ -0,0 +1,136 @@
+"""Benchmark cold start: import time and first-response latency.
+
+Import time of ``app.bot`` is measured in fresh interpreters, together
+with the slowest modules reported by ``-X importtime``. First-response
+latency starts the bot in-process with the load test's local Ollama and
+Telegram stand-ins (PostgreSQL and Redis are the real ones) and times
+readiness, then the first and second uncached questions.
+
+Usage:
+    python -m scripts.benchmark_startup --import-runs 5
+    python -m scripts.benchmark_startup --no-prewarm
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+IMPORT_ENV = {
+    'TELEGRAM_BOT_TOKEN': '123456:benchmark',
+    'OLLAMA_API_KEY': 'benchmark',
+}
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Rows of ``-X importtime`` output as module, self and cumulative us."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append({
+            'module': module.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+        })
+    return rows
+
+
+def measure_imports(runs: int, top: int) -> Dict[str, Any]:
+    env = {**IMPORT_ENV, **os.environ}
+    totals = []
+    rows = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import app.bot'],
+            env=env, capture_output=True, text=True, check=True
+        )
+        rows = parse_importtime(completed.stderr)
+        totals.append(next(
+            row['cumulative_ms'] for row in rows if row['module'] == 'app.bot'
+        ))
+    slowest = sorted(rows, key=lambda row: row['self_ms'], reverse=True)
+    return {
+        'runs': runs,
+        'import_ms': {
+            'min': round(min(totals), 3),
+            'median': round(sorted(totals)[len(totals) // 2], 3),
+            'max': round(max(totals), 3),
+        },
+        'slowest_modules': slowest[:top],
+    }
+
+
+def question() -> str:
+    # A fresh number each time, so the answer is never cached
+    views = random.randint(1, 10 ** 9)
+    return f'Сколько видео набрало больше {views} просмотров?'
+
+
+async def measure_first_response(args: argparse.Namespace) -> Dict[str, Any]:
+    started = time.perf_counter()
+    from scripts import run_load
+    imported = time.perf_counter()
+    from ollama import AsyncClient
+
+    fake_ollama = run_load.FakeOllama(args.llm_latency_ms, 0)
+    await fake_ollama.start()
+    run_load.bot.session = run_load.StubSession(args.telegram_latency_ms)
+    run_load.llm_processor.client = AsyncClient(host=fake_ollama.url)
+    report = {'prewarm': not args.no_prewarm}
+    try:
+        startup_started = time.perf_counter()
+        await run_load.on_startup()
+        report['startup_ms'] = (time.perf_counter() - startup_started) * 1000
+        for name, update_id in (('first', 1), ('second', 2)):
+            update = run_load.make_update(update_id, update_id, question())
+            request_started = time.perf_counter()
+            await run_load.dp.feed_update(run_load.bot, update)
+            report[f'{name}_response_ms'] = (
+                time.perf_counter() - request_started
+            ) * 1000
+    finally:
+        await run_load.on_shutdown()
+        await fake_ollama.stop()
+    report['import_ms'] = (imported - started) * 1000
+    report['process_to_first_response_ms'] = (
+        report['import_ms'] + report['startup_ms']
+        + report['first_response_ms']
+    )
+    return {key: round(value, 3) if isinstance(value, float) else value
+            for key, value in report.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--import-runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10,
+                        help='slowest modules to report')
+    parser.add_argument('--llm-latency-ms', type=float, default=500)
+    parser.add_argument('--telegram-latency-ms', type=float, default=20)
+    parser.add_argument('--no-prewarm', action='store_true',
+                        help='skip DB and LLM prewarm for comparison')
+    parser.add_argument('--skip-first-response', action='store_true',
+                        help='only measure import time')
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+    if args.no_prewarm:
+        os.environ['PREWARM_DB_CONNECTIONS'] = '0'
+        os.environ['PREWARM_LLM_TIMEOUT'] = '0'
+    report = {'imports': measure_imports(args.import_runs, args.top)}
+    if not args.skip_first_response:
+        report['first_response'] = asyncio.run(measure_first_response(args))
+    rendered = json.dumps(report, indent=2, ensure_ascii=False)
+    print(rendered)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(rendered)
+
+
+if __name__ == '__main__':
+    main()
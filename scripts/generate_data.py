@@ -0,0 +1,263 @@
+"""Generate a synthetic video analytics dataset.
+
+Produces either a ``videos.json`` in the format read by
+``scripts.load_data`` or CSV files ready for PostgreSQL ``COPY``; with
+``--load`` the rows are streamed straight into the database via COPY.
+
+Usage:
+    python -m scripts.generate_data --scale 1M --format json
+    python -m scripts.generate_data --scale 10M --format copy --load
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Number of snapshots for the named scales
+SCALES = {
+    '1M': 1_000_000,
+    '10M': 10_000_000,
+    '100M': 100_000_000,
+}
+COPY_BATCH_SIZE = 50_000
+
+VIDEO_COLUMNS = (
+    'id', 'creator_id', 'video_created_at', 'views_count', 'likes_count',
+    'comments_count', 'reports_count', 'created_at', 'updated_at',
+)
+SNAPSHOT_COLUMNS = (
+    'id', 'video_id', 'views_count', 'likes_count', 'comments_count',
+    'reports_count', 'delta_views_count', 'delta_likes_count',
+    'delta_comments_count', 'delta_reports_count', 'created_at',
+    'updated_at',
+)
+
+
+@dataclass
+class GeneratorConfig:
+    creators: int
+    videos: int
+    snapshots_per_video: int
+    cadence_hours: float
+    start: datetime
+    days: int
+    skew: float
+    seed: int
+
+
+def md5_id(*parts) -> str:
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+class DatasetGenerator:
+    """Videos with hourly-ish snapshots of cumulative counters.
+
+    Creator activity and video popularity follow a Pareto distribution
+    (``skew`` is its shape: lower means a heavier tail), and growth decays
+    with video age, as it does for real uploads.
+    """
+
+    def __init__(self, config: GeneratorConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.creator_ids = [
+            md5_id('creator', i) for i in range(config.creators)
+        ]
+        self.creator_cum_weights = list(itertools.accumulate(
+            self.random.paretovariate(config.skew)
+            for _ in range(config.creators)
+        ))
+
+    def _video_created_at(self) -> datetime:
+        offset = self.random.uniform(0, self.config.days * 86400)
+        return self.config.start + timedelta(seconds=offset)
+
+    def video(self) -> Tuple[tuple, List[tuple]]:
+        """One ``videos`` row and its ``video_snapshots`` rows."""
+        cfg = self.config
+        rnd = self.random
+        video_id = str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+        creator_id = rnd.choices(
+            self.creator_ids, cum_weights=self.creator_cum_weights
+        )[0]
+        created_at = self._video_created_at()
+        popularity = rnd.paretovariate(cfg.skew) * 1000
+        counts = [0, 0, 0, 0]
+        snapshots = []
+        for n in range(cfg.snapshots_per_video):
+            taken_at = created_at + timedelta(hours=cfg.cadence_hours * n)
+            decay = 1 / (1 + n * cfg.cadence_hours / 24)
+            views = int(rnd.expovariate(1 / (popularity * decay)))
+            delta = (
+                views,
+                int(views * rnd.uniform(0.01, 0.08)),
+                int(views * rnd.uniform(0.0, 0.01)),
+                int(rnd.random() < 0.001 * decay),
+            )
+            counts = [c + d for c, d in zip(counts, delta)]
+            snapshots.append((
+                md5_id(video_id, n), video_id, *counts, *delta,
+                taken_at, taken_at,
+            ))
+        last_seen = snapshots[-1][-1] if snapshots else created_at
+        video = (
+            video_id, creator_id, created_at, *counts, created_at, last_seen,
+        )
+        return video, snapshots
+
+    def videos(self) -> Iterator[Tuple[tuple, List[tuple]]]:
+        for _ in range(self.config.videos):
+            yield self.video()
+
+
+def write_json(generator: DatasetGenerator, path: Path):
+    """Stream ``{"videos": [...]}`` without holding it all in memory."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"videos": [\n')
+        for index, (video, snapshots) in enumerate(generator.videos()):
+            record = dict(zip(VIDEO_COLUMNS, video))
+            record['snapshots'] = [
+                dict(zip(SNAPSHOT_COLUMNS, row)) for row in snapshots
+            ]
+            if index:
+                f.write(',\n')
+            f.write(json.dumps(record, default=datetime.isoformat))
+        f.write('\n]}\n')
+    logger.info(f'Wrote {path}')
+
+
+def write_copy(generator: DatasetGenerator, directory: Path):
+    """Write ``videos.csv`` and ``video_snapshots.csv`` for COPY ... CSV."""
+    directory.mkdir(parents=True, exist_ok=True)
+    videos_path = directory / 'videos.csv'
+    snapshots_path = directory / 'video_snapshots.csv'
+    with open(videos_path, 'w', newline='') as vf, \
+            open(snapshots_path, 'w', newline='') as sf:
+        videos_writer = csv.writer(vf)
+        snapshots_writer = csv.writer(sf)
+        for video, snapshots in generator.videos():
+            videos_writer.writerow(video)
+            snapshots_writer.writerows(snapshots)
+    logger.info(
+        f'Wrote {videos_path} and {snapshots_path}; load with\n'
+        f"  \\copy videos ({', '.join(VIDEO_COLUMNS)}) "
+        f"FROM '{videos_path}' CSV\n"
+        f"  \\copy video_snapshots ({', '.join(SNAPSHOT_COLUMNS)}) "
+        f"FROM '{snapshots_path}' CSV"
+    )
+
+
+async def load_copy(generator: DatasetGenerator):
+    """Stream generated rows into PostgreSQL with COPY, in batches."""
+    import asyncpg
+
+    from app.config import settings
+
+    dsn = settings.DATABASE_URL_ADMIN.replace('+asyncpg', '')
+    conn = await asyncpg.connect(dsn)
+    try:
+        videos, snapshots = [], []
+        total_videos = total_snapshots = 0
+
+        async def flush():
+            nonlocal videos, snapshots, total_videos, total_snapshots
+            # Videos first: snapshots reference them
+            await conn.copy_records_to_table(
+                'videos', records=videos, columns=VIDEO_COLUMNS
+            )
+            await conn.copy_records_to_table(
+                'video_snapshots', records=snapshots,
+                columns=SNAPSHOT_COLUMNS
+            )
+            total_videos += len(videos)
+            total_snapshots += len(snapshots)
+            logger.info(
+                f'Loaded {total_videos} videos, {total_snapshots} snapshots'
+            )
+            videos, snapshots = [], []
+
+        for video, rows in generator.videos():
+            videos.append(video)
+            snapshots.extend(rows)
+            if len(snapshots) >= COPY_BATCH_SIZE:
+                await flush()
+        if videos:
+            await flush()
+        await conn.execute('ANALYZE videos; ANALYZE video_snapshots;')
+    finally:
+        await conn.close()
+
+
+def build_config(args: argparse.Namespace) -> GeneratorConfig:
+    videos = args.videos
+    if args.scale:
+        videos = max(1, SCALES[args.scale] // args.snapshots_per_video)
+    return GeneratorConfig(
+        creators=args.creators,
+        videos=videos,
+        snapshots_per_video=args.snapshots_per_video,
+        cadence_hours=args.cadence_hours,
+        start=datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc),
+        days=args.days,
+        skew=args.skew,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--scale', choices=SCALES,
+        help='target snapshot count, overrides --videos'
+    )
+    parser.add_argument('--creators', type=int, default=1000)
+    parser.add_argument('--videos', type=int, default=10_000)
+    parser.add_argument('--snapshots-per-video', type=int, default=48)
+    parser.add_argument('--cadence-hours', type=float, default=1.0)
+    parser.add_argument('--start', default='2025-11-01')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument(
+        '--skew', type=float, default=1.2,
+        help='Pareto shape of creator and video popularity'
+    )
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', choices=('json', 'copy'), default='json')
+    parser.add_argument('--output', default='data')
+    parser.add_argument(
+        '--load', action='store_true',
+        help='COPY rows straight into the database (copy format only)'
+    )
+    args = parser.parse_args()
+    config = build_config(args)
+    logger.info(
+        f'Generating {config.videos} videos x '
+        f'{config.snapshots_per_video} snapshots'
+    )
+    generator = DatasetGenerator(config)
+    output = Path(args.output)
+    if args.format == 'json':
+        write_json(generator, output / 'videos.json')
+    elif args.load:
+        asyncio.run(load_copy(generator))
+    else:
+        write_copy(generator, output)
+
+
+if __name__ == '__main__':
+    main()
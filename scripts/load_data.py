@@ -5,6 +5,7 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
+from app.cache import cache
 from app.db import db
 from app.models import Video, VideoSnapshot
 
@@ -103,6 +104,10 @@ async def main():
     try:
         await load_json_data(json_path)
         logger.info('Data loading completed successfully')
+        # Invalidate cached answers, running bots re-warm popular ones
+        await cache.connect()
+        await cache.bump_data_version()
+        await cache.close()
     except Exception as e:
         logger.error(f'Error loading data: {e}', exc_info=True)
         sys.exit(1)
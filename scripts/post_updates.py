@@ -0,0 +1,100 @@
+"""Post synthetic Telegram updates to a local webhook server.
+
+Usage:
+    python -m scripts.post_updates --count 1000 --concurrency 50
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+
+import aiohttp
+
+from app.config import settings
+from scripts.stats import percentile
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SAMPLE_QUESTIONS = [
+    'Сколько всего видео есть в системе?',
+    'Сколько видео набрало больше 100000 просмотров?',
+    'На сколько просмотров выросли все видео 28 ноября 2025?',
+    'Сколько видео получали новые просмотры 27 ноября 2025?',
+]
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'Load'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': user,
+            'text': text,
+        },
+    }
+
+
+async def post_updates(url: str, count: int, concurrency: int, chats: int):
+    headers = {}
+    if settings.WEBHOOK_SECRET:
+        headers['X-Telegram-Bot-Api-Secret-Token'] = settings.WEBHOOK_SECRET
+    update_ids = itertools.count(int(time.time() * 1000))
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def post_one(session: aiohttp.ClientSession):
+        nonlocal failures
+        update = make_update(
+            next(update_ids),
+            random.randint(1, chats),
+            random.choice(SAMPLE_QUESTIONS)
+        )
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as r:
+                latencies.append(time.perf_counter() - started)
+                if r.status != 200:
+                    failures += 1
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(post_one(session) for _ in range(count)))
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f'Posted {count} updates in {elapsed:.2f}s '
+        f'({count / elapsed:.0f} updates/s), failures: {failures}'
+    )
+    logger.info(
+        f'Ack latency p50={percentile(latencies, 50) * 1000:.1f}ms '
+        f'p99={percentile(latencies, 99) * 1000:.1f}ms'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--url',
+        default=f'http://localhost:{settings.WEBHOOK_PORT}'
+                f'{settings.WEBHOOK_PATH}'
+    )
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--chats', type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(
+        post_updates(args.url, args.count, args.concurrency, args.chats)
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Replay journaled queries against the current build.
+
+Reads the query journal (JSON lines file or the ``query_journal`` table),
+re-runs each question and compares results and latency with the journal.
+
+Modes:
+    sql   - re-execute the journaled SQL only (database regressions)
+    full  - regenerate SQL with the LLM, then execute (prompt/model changes)
+
+Usage:
+    python -m scripts.replay_journal --mode sql --limit 200
+    python -m scripts.replay_journal --source postgres --mode full
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.db import db
+from app.llm_processor import llm_processor
+from app.models import QueryJournalEntry
+from scripts.stats import latency_summary
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+REPLAYABLE_OUTCOMES = ('answered', 'cached')
+
+
+def read_file(path: Path, limit: int) -> List[Dict[str, Any]]:
+    entries = []
+    skipped = 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                replayable = (
+                    entry['outcome'] in REPLAYABLE_OUTCOMES and entry['sql']
+                )
+            except (ValueError, KeyError, TypeError):
+                # Torn or truncated lines, e.g. after a crash mid-write
+                skipped += 1
+                continue
+            if replayable:
+                entries.append(entry)
+    if skipped:
+        logger.warning(f'Skipped {skipped} unparseable journal lines')
+    return entries[-limit:]
+
+
+async def read_table(limit: int) -> List[Dict[str, Any]]:
+    # The writer role cannot read the journal back; replay is an operator
+    # tool and reads it with the admin credentials
+    engine = create_async_engine(settings.DATABASE_URL_ADMIN)
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                select(QueryJournalEntry.__table__)
+                .where(QueryJournalEntry.outcome.in_(REPLAYABLE_OUTCOMES))
+                .where(QueryJournalEntry.sql.is_not(None))
+                .order_by(QueryJournalEntry.id.desc())
+                .limit(limit)
+            )
+            return [dict(row._mapping) for row in result][::-1]
+    finally:
+        await engine.dispose()
+
+
+async def replay_one(entry: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    sql = entry['sql']
+    if mode == 'full':
+        sql = await llm_processor.text_to_sql(entry['question'])
+    result = await db.execute_raw_query(sql)
+    return {
+        'question': entry['question'],
+        'latency': time.perf_counter() - started,
+        'sql_changed': sql != entry['sql'],
+        'result_changed': result != entry['result'],
+        'old_result': entry['result'],
+        'new_result': result,
+    }
+
+
+async def replay(entries: List[Dict[str, Any]], mode: str,
+                 concurrency: int) -> Dict[str, Any]:
+    db.init()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def guarded(entry):
+        async with semaphore:
+            return await replay_one(entry, mode)
+
+    try:
+        results = await asyncio.gather(
+            *(guarded(entry) for entry in entries), return_exceptions=True
+        )
+    finally:
+        await db.close()
+    replayed = [r for r in results if not isinstance(r, Exception)]
+    errors = Counter(type(r).__name__ for r in results
+                     if isinstance(r, Exception))
+    for r in replayed:
+        if r['result_changed']:
+            logger.warning(
+                f"Result changed for {r['question']!r}: "
+                f"{r['old_result']} -> {r['new_result']}"
+            )
+    report = {
+        'mode': mode,
+        'replayed': len(replayed),
+        'errors': dict(errors),
+        'sql_changed': sum(r['sql_changed'] for r in replayed),
+        'result_changed': sum(r['result_changed'] for r in replayed),
+    }
+    # Journaled latencies cover the whole request, replays only the
+    # replayed stages; compare against the matching journal stages.
+    stages = ('llm', 'validation', 'db') if mode == 'full' else ('db',)
+    journaled = [
+        sum(entry['stages'].get(stage, 0) for stage in stages) / 1000
+        for entry in entries if any(s in entry['stages'] for s in stages)
+    ]
+    if journaled:
+        report['journal_latency'] = latency_summary(journaled)
+    if replayed:
+        report['replay_latency'] = latency_summary(
+            [r['latency'] for r in replayed]
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--source', choices=('file', 'postgres'),
+                        default='file')
+    parser.add_argument('--path', default=settings.JOURNAL_PATH)
+    parser.add_argument('--mode', choices=('sql', 'full'), default='sql')
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+    if args.source == 'file':
+        entries = read_file(Path(args.path), args.limit)
+    else:
+        entries = asyncio.run(read_table(args.limit))
+    logger.info(f'Replaying {len(entries)} journaled queries')
+    report = asyncio.run(replay(entries, args.mode, args.concurrency))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""End-to-end load test of process_query with local stand-ins.
+
+Synthetic updates are fed into the aiogram ``Dispatcher`` at a fixed
+concurrency. Ollama is replaced by a local HTTP server returning canned
+SQL after a tunable delay and the Telegram Bot API by an in-process
+session; PostgreSQL and Redis are the real ones from the environment.
+Numbers and dates in the questions are drawn per request, so most of
+them miss the result cache like real traffic does. The ``queue`` stage is
+the wait for one of the fair scheduler's query slots, whose count is part
+of the report.
+
+Usage:
+    python -m scripts.run_load --requests 500 --concurrency 50 \\
+        --llm-latency-ms 800
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# The harness runs without real credentials and must not be throttled
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:load-test')
+os.environ.setdefault('OLLAMA_API_KEY', 'load-test')
+os.environ.setdefault('RATE_LIMIT_USER_CAPACITY', '1000000000')
+os.environ.setdefault('RATE_LIMIT_CHAT_CAPACITY', '1000000000')
+os.environ.setdefault('METRICS_PORT', '0')
+os.environ['TRACE_SAMPLE_RATE'] = '1'
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import SendMessage, TelegramMethod  # noqa: E402
+from aiogram.types import Chat, Message, Update, User  # noqa: E402
+from ollama import AsyncClient  # noqa: E402
+
+from app.bot import bot, dp, on_shutdown, on_startup  # noqa: E402
+from app.cache import cache  # noqa: E402
+from app.llm_processor import llm_processor  # noqa: E402
+from app.rate_limit import fair_scheduler  # noqa: E402
+from scripts.stats import latency_summary  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Question and SQL templates the fake LLM answers with, and the range
+# ``{n}`` is drawn from for every request
+CANNED_SQL: List[Tuple[str, str, Optional[Tuple[int, int]]]] = [
+    ('Сколько всего видео есть в системе?',
+     'SELECT COUNT(*) FROM videos;', None),
+    ('Сколько видео набрало больше {n} просмотров?',
+     'SELECT COUNT(*) FROM videos WHERE views_count > {n};', (1, 10 ** 6)),
+    ('На сколько просмотров выросли все видео {n} ноября 2025?',
+     'SELECT COALESCE(SUM(delta_views_count), 0) FROM video_snapshots '
+     "WHERE DATE(created_at) = '2025-11-{n:02d}';", (1, 30)),
+    ('Сколько видео получали новые просмотры {n} ноября 2025?',
+     'SELECT COUNT(DISTINCT video_id) FROM video_snapshots '
+     "WHERE DATE(created_at) = '2025-11-{n:02d}' "
+     'AND delta_views_count > 0;', (1, 30)),
+]
+DEFAULT_SQL = 'SELECT COUNT(*) FROM videos;'
+# Stands in for ``{n}`` while building prompt patterns; it must not occur
+# in any template
+SENTINEL = 29
+
+
+def random_question() -> str:
+    question, _, bounds = random.choice(CANNED_SQL)
+    if bounds is None:
+        return question
+    return question.format(n=random.randint(*bounds))
+
+
+def prompt_pattern(question: str) -> re.Pattern:
+    """Match the question as it appears in the prompt, capturing ``{n}``.
+
+    The prompt carries the question with dates already translated.
+    """
+    sample = llm_processor._translate_russian_dates(
+        question.format(n=SENTINEL)
+    )
+    return re.compile(
+        re.escape(sample).replace(str(SENTINEL), r'(\d+)', 1)
+    )
+
+
+class FakeOllama:
+    """Local /api/generate returning canned SQL after a tunable delay."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.runner = None
+        self.url = ''
+        self.calls = 0
+        self.canned = [
+            (prompt_pattern(question), sql) for question, sql, _ in CANNED_SQL
+        ]
+
+    async def handle_generate(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.calls += 1
+        prompt = payload.get('prompt', '')
+        sql = DEFAULT_SQL
+        for pattern, template in self.canned:
+            match = pattern.search(prompt)
+            if match:
+                n = int(match.group(1)) if match.groups() else 0
+                sql = template.format(n=n)
+                break
+        delay = max(0.0, random.gauss(self.latency, self.jitter))
+        await asyncio.sleep(delay)
+        return web.json_response({
+            'model': payload.get('model', ''),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'response': f'```sql\n{sql}\n```',
+            'done': True,
+            'prompt_eval_count': len(prompt) // 4,
+            'eval_count': len(sql) // 4,
+        })
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/api/generate', self.handle_generate)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f'http://127.0.0.1:{port}'
+        logger.info(f'Fake Ollama listening on {self.url}')
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+class StubSession(BaseSession):
+    """Bot API session answering every method locally."""
+
+    def __init__(self, latency_ms: float):
+        super().__init__()
+        self.latency = latency_ms / 1000
+        self.sent = Counter()
+
+    async def make_request(self, bot: Bot, method: TelegramMethod,
+                           timeout: int = None) -> Any:
+        await asyncio.sleep(self.latency)
+        self.sent[type(method).__name__] += 1
+        if isinstance(method, SendMessage):
+            return Message(
+                message_id=random.randint(1, 2 ** 31),
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=method.chat_id, type='private'),
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(
+        self, url: str, headers: Optional[Dict[str, Any]] = None,
+        timeout: int = 30, chunk_size: int = 65536,
+        raise_for_status: bool = True
+    ) -> AsyncGenerator[bytes, None]:
+        # The bot never downloads files; serve every one as empty
+        await asyncio.sleep(self.latency)
+        self.sent['download'] += 1
+        yield b''
+
+    async def close(self):
+        pass
+
+
+class TraceCollector(logging.Handler):
+    """Keep every emitted request trace for the stage breakdown."""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.traces: List[Dict[str, Any]] = []
+
+    def emit(self, record: logging.LogRecord):
+        self.traces.append(json.loads(record.getMessage()))
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> Update:
+    user = User(id=chat_id, is_bot=False, first_name='Load')
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=chat_id, type='private'),
+            from_user=user,
+            text=text,
+        ).as_(bot),
+    )
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fake_ollama = FakeOllama(args.llm_latency_ms, args.llm_jitter_ms)
+    await fake_ollama.start()
+    session = StubSession(args.telegram_latency_ms)
+    bot.session = session
+    llm_processor.client = AsyncClient(host=fake_ollama.url)
+    collector = TraceCollector()
+    logging.getLogger('app.trace').addHandler(collector)
+    logging.getLogger('app.trace').propagate = False
+
+    if args.max_concurrent_queries:
+        fair_scheduler.slots = args.max_concurrent_queries
+    await on_startup()
+    if args.clear_cache:
+        await cache.clear()
+    update_ids = itertools.count(1)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+
+    async def one(index: int):
+        # Each request gets its own chat so none is cancelled as superseded
+        update = make_update(
+            next(update_ids), index + 1, random_question()
+        )
+        async with semaphore:
+            started = time.perf_counter()
+            await dp.feed_update(bot, update)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await on_shutdown()
+        await fake_ollama.stop()
+
+    stages = defaultdict(list)
+    outcomes = Counter()
+    for trace in collector.traces:
+        outcomes[trace['attributes'].get('outcome', trace['error'])] += 1
+        for span in trace['spans']:
+            stages[span['name']].append(span['duration_ms'] / 1000)
+    return {
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        # Requests past this many wait in the queue stage
+        'max_concurrent_queries': fair_scheduler.slots,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(args.requests / elapsed, 2),
+        'end_to_end': latency_summary(latencies),
+        'stages': {
+            name: latency_summary(values) for name, values in stages.items()
+        },
+        'outcomes': dict(outcomes),
+        'llm_calls': fake_ollama.calls,
+        'telegram_calls': dict(session.sent),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--llm-latency-ms', type=float, default=500)
+    parser.add_argument('--llm-jitter-ms', type=float, default=100)
+    parser.add_argument('--telegram-latency-ms', type=float, default=20)
+    parser.add_argument(
+        '--max-concurrent-queries', type=int, default=0,
+        help='fair scheduler slots, MAX_CONCURRENT_QUERIES if not given'
+    )
+    parser.add_argument(
+        '--clear-cache', action='store_true',
+        help='start cold: drop cached results first'
+    )
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    rendered = json.dumps(report, indent=2, ensure_ascii=False)
+    print(rendered)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(rendered)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+import os
+
+# app.config validates credentials at import; tests never reach Telegram
+# or Ollama
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:test')
+os.environ.setdefault('OLLAMA_API_KEY', 'test')
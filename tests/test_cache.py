@@ -0,0 +1,134 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from app.cache import Cache, normalize_query
+
+
+class TestNormalizeQuery:
+
+    def test_case_and_whitespace(self):
+        assert normalize_query('  Сколько   ВСЕГО видео ') == (
+            'сколько всего видео'
+        )
+
+    def test_trailing_punctuation(self):
+        assert normalize_query('Сколько всего видео?!') == (
+            'сколько всего видео'
+        )
+
+    def test_yo_replaced(self):
+        assert normalize_query('Ещё видео') == 'еще видео'
+
+
+class TestCacheKeys:
+
+    def test_equivalent_questions_share_key(self):
+        cache = Cache()
+        assert cache._make_key('Сколько видео?') == (
+            cache._make_key('сколько  видео')
+        )
+
+    def test_data_version_changes_result_key_only(self):
+        cache = Cache()
+        result_key, sql_key = cache._make_key('q'), cache._make_sql_key('q')
+        cache.data_version = 5
+        assert cache._make_key('q') != result_key
+        assert cache._make_key('q').startswith('query:5:')
+        assert cache._make_sql_key('q') == sql_key
+
+
+class TestNegativeCacheKeys:
+
+    def test_failure_key_ignores_data_version(self):
+        cache = Cache()
+        key = cache._make_failure_key('Сколько видео?')
+        cache.data_version = 3
+        assert cache._make_failure_key('сколько видео') == key
+
+    def test_equivalent_sql_shares_fingerprint(self):
+        assert Cache._make_failed_sql_key(
+            'select count(*)  from VIDEOS'
+        ) == Cache._make_failed_sql_key('SELECT COUNT(*) FROM videos;')
+
+    def test_different_sql_has_different_fingerprint(self):
+        assert Cache._make_failed_sql_key(
+            'SELECT COUNT(*) FROM videos;'
+        ) != Cache._make_failed_sql_key(
+            'SELECT COUNT(*) FROM video_snapshots;'
+        )
+
+
+class FakeRedis:
+
+    def __init__(self, value):
+        self.value = value
+
+    async def get(self, key):
+        return self.value
+
+    def pipeline(self, transaction=True):
+        self.pipe = FakePipeline(self.value)
+        return self.pipe
+
+
+class FakePipeline:
+
+    def __init__(self, value):
+        self.value = value
+        self.commands = 0
+
+    def get(self, key):
+        self.commands += 1
+
+    def zincrby(self, key, amount, member):
+        self.commands += 1
+
+    def zremrangebyrank(self, key, start, end):
+        self.commands += 1
+        self.trimmed = (start, end)
+
+    async def execute(self):
+        return [self.value] + [1] * (self.commands - 1)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestBackgroundLookups:
+
+    def test_uncounted_failure_lookup_saves_nothing(self):
+        cache = Cache()
+        cache.client = FakeRedis('validation:120')
+        before = sample('bot_llm_saved_tokens_total', reason='validation')
+        assert asyncio.run(cache.get_failure('q', count=False)) == (
+            'validation', 120
+        )
+        assert sample(
+            'bot_llm_saved_tokens_total', reason='validation'
+        ) == before
+        asyncio.run(cache.get_failure('q'))
+        assert sample(
+            'bot_llm_saved_tokens_total', reason='validation'
+        ) == before + 120
+
+    def test_uncounted_get_leaves_hit_ratio(self):
+        cache = Cache()
+        cache.client = FakeRedis('7')
+        before = sample('bot_cache_requests_total', result='hit')
+        assert asyncio.run(cache.get('q', count=False)) == 7
+        assert sample('bot_cache_requests_total', result='hit') == before
+
+
+class TestQueryFrequency:
+
+    def test_counted_get_sometimes_trims_frequency_table(self, monkeypatch):
+        cache = Cache()
+        cache.client = FakeRedis(None)
+        monkeypatch.setattr('app.cache.random.random', lambda: 0.0)
+        assert asyncio.run(cache.get('q')) is None
+        assert cache.client.pipe.trimmed == (0, -10001)
+        monkeypatch.setattr('app.cache.random.random', lambda: 0.5)
+        asyncio.run(cache.get('q'))
+        assert not hasattr(cache.client.pipe, 'trimmed')
@@ -0,0 +1,30 @@
+import asyncio
+
+from sqlalchemy.exc import DBAPIError
+
+from app.db import failure_reason
+
+
+def db_error(sqlstate: str) -> DBAPIError:
+    orig = Exception('error')
+    orig.sqlstate = sqlstate
+    return DBAPIError('SELECT 1', {}, orig)
+
+
+class TestFailureReason:
+
+    def test_deterministic_errors(self):
+        # undefined_column, division_by_zero
+        assert failure_reason(db_error('42703'), 60000) == 'execution'
+        assert failure_reason(db_error('22012'), 60000) == 'execution'
+
+    def test_transient_errors_are_not_cached(self):
+        # too_many_connections, serialization_failure, admin_shutdown
+        for sqlstate in ('53300', '40001', '57P01'):
+            assert failure_reason(db_error(sqlstate), 60000) is None
+
+    def test_timeout_needs_half_the_budget(self, monkeypatch):
+        monkeypatch.setattr('app.db.settings.REQUEST_TIMEOUT', 60)
+        error = asyncio.TimeoutError()
+        assert failure_reason(error, 30000) == 'timeout'
+        assert failure_reason(error, 5000) is None
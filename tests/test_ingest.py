@@ -0,0 +1,205 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy.exc import DataError, OperationalError
+
+from app.ingest import (
+    FileSource,
+    SnapshotIngestor,
+    decode_event,
+    ingest_batch,
+    latest_snapshots,
+    new_video_rows,
+    parse_event,
+)
+
+
+def make_event(snapshot_id, created_at, views, **extra):
+    return {
+        'id': snapshot_id,
+        'video_id': 'v1',
+        'created_at': created_at,
+        'views_count': views,
+        'delta_views_count': 1,
+        **extra,
+    }
+
+
+class TestIngest:
+
+    def test_parse_event_defaults(self):
+        row = parse_event(make_event('s1', '2025-11-26T10:00:00+00:00', 5))
+        assert row['views_count'] == 5
+        assert row['likes_count'] == 0
+        assert row['updated_at'] == row['created_at']
+
+    def test_new_video_rows_need_creator(self):
+        events = [
+            make_event('s1', '2025-11-26T10:00:00+00:00', 5),
+            make_event('s2', '2025-11-26T11:00:00+00:00', 6,
+                       creator_id='c1',
+                       video_created_at='2025-11-01T00:00:00+00:00'),
+        ]
+        videos = new_video_rows(events)
+        assert [v['id'] for v in videos] == ['v1']
+        assert videos[0]['creator_id'] == 'c1'
+
+    def test_latest_snapshot_skips_duplicates(self):
+        rows = [
+            parse_event(make_event('s1', '2025-11-26T10:00:00+00:00', 5)),
+            parse_event(make_event('s3', '2025-11-26T12:00:00+00:00', 9)),
+            parse_event(make_event('s2', '2025-11-26T11:00:00+00:00', 7)),
+        ]
+        assert latest_snapshots(rows, {'s1', 's2', 's3'})['v1']['id'] == 's3'
+        # s3 was already stored, so it must not move the counters again
+        assert latest_snapshots(rows, {'s1', 's2'})['v1']['id'] == 's2'
+
+    def test_version_bump_is_throttled(self, monkeypatch):
+        bumps = []
+
+        async def bump():
+            bumps.append(1)
+
+        monkeypatch.setattr('app.ingest.cache.bump_data_version', bump)
+        ingestor = SnapshotIngestor()
+        ingestor.version_interval = 3600
+
+        async def run():
+            for _ in range(3):
+                ingestor.pending_bump = True
+                await ingestor.maybe_bump_version()
+            await ingestor.maybe_bump_version(force=True)
+
+        asyncio.run(run())
+        assert len(bumps) == 2
+
+
+class FakeSource:
+
+    def __init__(self):
+        self.acked = []
+        self.dead = []
+
+    async def ack(self, entry_ids):
+        self.acked.extend(entry_ids)
+
+    async def dead_letter(self, rejected):
+        self.dead.extend(rejected)
+
+
+class FakeIngestor:
+    """Treats every event of video ``orphan`` as an unknown video."""
+
+    async def write(self, events):
+        orphans = [
+            i for i, event in enumerate(events)
+            if event['video_id'] == 'orphan'
+        ]
+        return len(events) - len(orphans), orphans
+
+
+class TestDeadLetters:
+
+    @pytest.mark.parametrize('payload', [
+        'not json',
+        None,
+        '[1, 2]',
+        json.dumps({'id': 's1', 'video_id': 'v1'}),
+        json.dumps(make_event('s1', 'yesterday', 5)),
+        json.dumps(make_event('s' * 33, '2025-11-26T10:00:00+00:00', 5)),
+        json.dumps(make_event('s1', '2025-11-26T10:00:00+00:00', 2 ** 63)),
+        json.dumps(make_event(
+            's1', '2025-11-26T10:00:00+00:00', 5,
+            creator_id='c' * 33,
+            video_created_at='2025-11-01T00:00:00+00:00',
+        )),
+    ])
+    def test_decode_rejects_malformed_events(self, payload):
+        with pytest.raises((ValueError, KeyError, TypeError)):
+            decode_event(payload)
+
+    def test_bad_events_do_not_fail_the_batch(self):
+        good = make_event('s1', '2025-11-26T10:00:00+00:00', 5)
+        orphan = {**good, 'id': 's2', 'video_id': 'orphan'}
+        entries = [
+            ('1-0', json.dumps(good)),
+            ('2-0', 'not json'),
+            ('3-0', json.dumps(orphan)),
+        ]
+        source = FakeSource()
+        inserted = asyncio.run(ingest_batch(source, FakeIngestor(), entries))
+        assert inserted == 1
+        assert [entry_id for entry_id, *_ in source.dead] == ['2-0', '3-0']
+        assert source.acked == ['1-0', '2-0', '3-0']
+
+
+class PoisonIngestor:
+    """Rejects every batch holding an event of video ``poison``."""
+
+    def __init__(self, error):
+        self.error = error
+        self.batches = []
+
+    async def write(self, events):
+        self.batches.append(len(events))
+        if any(event['video_id'] == 'poison' for event in events):
+            raise self.error
+        return len(events), []
+
+
+class TestRejectedWrites:
+
+    def entries(self):
+        events = [
+            make_event(f's{i}', '2025-11-26T10:00:00+00:00', i)
+            for i in range(4)
+        ]
+        events[2]['video_id'] = 'poison'
+        return [(f'{i}-0', json.dumps(e)) for i, e in enumerate(events)]
+
+    def test_rejected_event_is_isolated_and_dead_lettered(self):
+        source = FakeSource()
+        ingestor = PoisonIngestor(
+            DataError('INSERT', {}, Exception('value too long'))
+        )
+        inserted = asyncio.run(
+            ingest_batch(source, ingestor, self.entries())
+        )
+        assert inserted == 3
+        assert [entry_id for entry_id, *_ in source.dead] == ['2-0']
+        assert source.acked == ['0-0', '1-0', '2-0', '3-0']
+
+    def test_transient_error_is_raised_for_retry(self):
+        source = FakeSource()
+        ingestor = PoisonIngestor(
+            OperationalError('INSERT', {}, Exception('connection lost'))
+        )
+        with pytest.raises(OperationalError):
+            asyncio.run(ingest_batch(source, ingestor, self.entries()))
+        assert ingestor.batches == [4]
+        assert not source.acked
+
+
+class TestFileSource:
+
+    def test_partial_line_is_read_once_complete(self, tmp_path):
+        path = tmp_path / 'snapshots.jsonl'
+        path.write_text('{"a": 1}\n{"b":', encoding='utf-8')
+        source = FileSource(str(path))
+
+        async def read():
+            return await source.read(10)
+
+        asyncio.run(source.open())
+        try:
+            assert [line for _, line in asyncio.run(read())] == [
+                '{"a": 1}\n'
+            ]
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(' 2}\n')
+            assert [line for _, line in asyncio.run(read())] == [
+                '{"b": 2}\n'
+            ]
+        finally:
+            asyncio.run(source.close())
@@ -47,6 +47,31 @@ class TestSQLValidation:
         sql = 'CREATE TABLE test (id INT);'
         assert llm_processor.validate_sql(sql) is False
 
+    def test_reject_other_tables(self, llm_processor):
+        sql = (
+            'SELECT COUNT(*) FROM query_journal '
+            "WHERE question ILIKE '%пароль%';"
+        )
+        assert llm_processor.validate_sql(sql) is False
+
+    def test_reject_system_catalogs(self, llm_processor):
+        sql = 'SELECT COUNT(*) FROM pg_catalog.pg_roles;'
+        assert llm_processor.validate_sql(sql) is False
+
+    def test_reject_journal_in_subquery(self, llm_processor):
+        sql = (
+            'SELECT COUNT(*) FROM videos WHERE views_count > '
+            '(SELECT MAX(result) FROM query_journal);'
+        )
+        assert llm_processor.validate_sql(sql) is False
+
+    def test_allow_cte(self, llm_processor):
+        sql = (
+            'WITH top AS (SELECT id FROM videos WHERE views_count > 10) '
+            'SELECT COUNT(*) FROM top;'
+        )
+        assert llm_processor.validate_sql(sql) is True
+
 
 class TestResponseCleaning:
 
@@ -94,3 +119,76 @@ class TestDateTranslation:
         query = 'Сколько всего видео?'
         result = llm_processor._translate_russian_dates(query)
         assert result == query
+
+
+class TestQuestionSplitting:
+
+    def test_single_question(self, llm_processor):
+        text = 'Сколько видео? Ответь числом'
+        assert llm_processor.split_questions(text) == [text]
+
+    def test_numbered_lines(self, llm_processor):
+        text = (
+            '1. Сколько всего видео?\n'
+            '2) Сколько лайков 28.11.2025?\n'
+            '\n'
+            '- Сколько креаторов'
+        )
+        assert llm_processor.split_questions(text) == [
+            'Сколько всего видео?',
+            'Сколько лайков 28.11.2025?',
+            'Сколько креаторов',
+        ]
+
+    def test_several_on_one_line(self, llm_processor):
+        text = 'Сколько видео? Сколько просмотров?'
+        assert llm_processor.split_questions(text) == [
+            'Сколько видео?', 'Сколько просмотров?'
+        ]
+
+    def test_wrapped_question_stays_whole(self, llm_processor):
+        text = (
+            'Сколько видео креатора с id aca1061a9d324ecf8c3fa2bb32d7be63\n'
+            'набрали больше 10000 просмотров?'
+        )
+        assert llm_processor.split_questions(text) == [
+            'Сколько видео креатора с id aca1061a9d324ecf8c3fa2bb32d7be63 '
+            'набрали больше 10000 просмотров?'
+        ]
+
+    def test_wrapped_numbered_items(self, llm_processor):
+        text = (
+            '1. Сколько всего видео\n'
+            'есть в системе?\n'
+            '2. Сколько лайков набрали\n'
+            'все видео'
+        )
+        assert llm_processor.split_questions(text) == [
+            'Сколько всего видео есть в системе?',
+            'Сколько лайков набрали все видео',
+        ]
+
+    def test_count_not_capped(self, llm_processor):
+        text = '\n'.join(f'{i}. Вопрос {i}?' for i in range(1, 13))
+        assert len(llm_processor.split_questions(text)) == 12
+
+
+class TestBatchResponseParsing:
+
+    def test_parse_numbered_statements(self, llm_processor):
+        text = (
+            '```sql\n'
+            '-- 2\n'
+            'SELECT COUNT(*) FROM video_snapshots;\n'
+            '-- 1\n'
+            'SELECT COUNT(*) FROM videos;\n'
+            '```'
+        )
+        assert llm_processor._parse_batch_response(text, 2) == [
+            'SELECT COUNT(*) FROM videos;',
+            'SELECT COUNT(*) FROM video_snapshots;',
+        ]
+
+    def test_missing_and_invalid_statements(self, llm_processor):
+        text = '-- 1\nDELETE FROM videos;\n-- 3\nSELECT 1;\n'
+        assert llm_processor._parse_batch_response(text, 2) == [None, None]
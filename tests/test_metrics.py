@@ -0,0 +1,39 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from app.metrics import MetricsServer
+from app.tracing import span
+
+
+def stage_count(stage: str) -> float:
+    return REGISTRY.get_sample_value(
+        'bot_stage_duration_seconds_count', {'stage': stage}
+    ) or 0.0
+
+
+class TestStageMetrics:
+
+    def test_span_records_duration(self):
+        before = stage_count('db')
+        with span('db'):
+            pass
+        assert stage_count('db') == before + 1
+
+    def test_span_records_on_error(self):
+        before = stage_count('llm')
+        try:
+            with span('llm'):
+                raise ValueError
+        except ValueError:
+            pass
+        assert stage_count('llm') == before + 1
+
+
+class TestReadiness:
+
+    def test_ready_only_after_startup(self):
+        server = MetricsServer()
+        assert asyncio.run(server.handle_ready(None)).status == 503
+        server.ready = True
+        assert asyncio.run(server.handle_ready(None)).status == 200
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.middlewares import RateLimitMiddleware
+from app.rate_limit import (
+    ALLOWED,
+    THROTTLED_CHAT,
+    THROTTLED_USER,
+    FairScheduler,
+    RateLimiter,
+)
+
+
+def make_limiter(user_capacity=2, chat_capacity=3) -> RateLimiter:
+    limiter = RateLimiter()
+    limiter.user_capacity = user_capacity
+    limiter.user_rate = 0.001
+    limiter.chat_capacity = chat_capacity
+    limiter.chat_rate = 0.001
+    return limiter
+
+
+class TestLocalRateLimiter:
+
+    def test_user_bucket_exhausted(self):
+        limiter = make_limiter()
+        verdicts = [limiter._check_local(1, 100) for _ in range(3)]
+        assert verdicts == [ALLOWED, ALLOWED, THROTTLED_USER]
+        assert limiter.local_counters['throttled_user'] == 1
+
+    def test_chat_bucket_shared_between_users(self):
+        limiter = make_limiter()
+        verdicts = [limiter._check_local(user, 100) for user in (1, 2, 3, 4)]
+        assert verdicts == [ALLOWED, ALLOWED, ALLOWED, THROTTLED_CHAT]
+
+    def test_check_without_redis_uses_local_buckets(self):
+        limiter = make_limiter(user_capacity=1)
+        assert asyncio.run(limiter.check(1, 100)) == ALLOWED
+        assert asyncio.run(limiter.check(1, 100)) == THROTTLED_USER
+
+
+class TestFairScheduler:
+
+    def test_heavy_user_does_not_starve_others(self):
+        scheduler = FairScheduler(slots=1)
+        gate = asyncio.Event()
+        order = []
+
+        async def request(user_id: int):
+            async with scheduler.slot(user_id):
+                order.append(user_id)
+                await gate.wait()
+
+        async def scenario():
+            tasks = [asyncio.create_task(request(1)) for _ in range(6)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(request(2)))
+            await asyncio.sleep(0)
+            gate.set()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(scenario())
+        assert order.index(2) == 2
+        assert scheduler.active == 0
+
+    def test_cancelled_waiter_releases_nothing(self):
+        scheduler = FairScheduler(slots=1)
+
+        async def scenario():
+            async with scheduler.slot(1):
+                waiter = asyncio.create_task(
+                    scheduler.slot(2).__aenter__()
+                )
+                await asyncio.sleep(0)
+                waiter.cancel()
+                await asyncio.gather(waiter, return_exceptions=True)
+                assert scheduler.queued == 0
+            assert scheduler.active == 0
+
+        asyncio.run(scenario())
+
+
+class FakeRedis:
+
+    def __init__(self, counters):
+        self.counters = counters
+
+    async def hgetall(self, key):
+        return self.counters
+
+
+class TestSharedCounters:
+
+    def test_refresh_copies_redis_counters(self, monkeypatch):
+        monkeypatch.setattr(
+            'app.rate_limit.cache.client',
+            FakeRedis({'allowed': '7', 'throttled_chat': '2'}),
+        )
+        limiter = make_limiter()
+        asyncio.run(limiter.refresh_counters())
+        assert limiter.shared_counters == {'allowed': 7, 'throttled_chat': 2}
+
+    def test_refresh_keeps_last_counters_on_error(self, monkeypatch):
+        monkeypatch.setattr('app.rate_limit.cache.client', FakeRedis(None))
+        limiter = make_limiter()
+        limiter.shared_counters = {'allowed': 3}
+        asyncio.run(limiter.refresh_counters())
+        assert limiter.shared_counters == {'allowed': 3}
+
+
+class FakeMessage:
+
+    def __init__(self, user_id: int = 1, chat_id: int = 100):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.chat = SimpleNamespace(id=chat_id)
+        self.message_id = 1
+        self.answers = []
+
+    async def answer(self, text: str):
+        self.answers.append(text)
+
+
+def flagged() -> dict:
+    return {'handler': SimpleNamespace(flags={'rate_limit': True})}
+
+
+class TestRateLimitMiddleware:
+
+    def test_handler_gets_deadline(self):
+        middleware = RateLimitMiddleware(make_limiter(), FairScheduler(1))
+        received = {}
+
+        async def handler(event, data):
+            received.update(data)
+
+        asyncio.run(middleware(handler, FakeMessage(), flagged()))
+        assert received['deadline'].remaining() > 0
+        assert received['queued_at'] <= time.perf_counter()
+
+    def test_slot_wait_bounded_by_request_timeout(self, monkeypatch):
+        monkeypatch.setattr(
+            'app.middlewares.settings.REQUEST_TIMEOUT', 0.05
+        )
+        scheduler = FairScheduler(slots=1)
+        middleware = RateLimitMiddleware(make_limiter(), scheduler)
+        message = FakeMessage(user_id=2, chat_id=200)
+        called = []
+
+        async def handler(event, data):
+            called.append(event)
+
+        async def scenario():
+            async with scheduler.slot(1):
+                await middleware(handler, message, flagged())
+            assert scheduler.active == 0
+
+        asyncio.run(scenario())
+        assert not called
+        assert len(message.answers) == 1
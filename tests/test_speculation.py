@@ -0,0 +1,116 @@
+import asyncio
+
+from app.llm_processor import canonical_sql
+from app.speculation import (
+    Speculation,
+    SqlSpeculator,
+    question_template,
+    substitute_literals,
+)
+from app.tasks import Deadline
+
+SQL_BY_DATE = (
+    'SELECT COALESCE(SUM(delta_views_count), 0) FROM video_snapshots '
+    "WHERE DATE(created_at) = '2025-11-28';"
+)
+
+
+class TestTemplates:
+
+    def test_dates_and_numbers_become_placeholders(self):
+        template, literals = question_template(
+            'Сколько видео набрало больше 100000 просмотров 1 ноября 2025?'
+        )
+        assert template == 'сколько видео набрало больше # просмотров #'
+        assert literals == ['100000', '2025-11-01']
+
+    def test_substitute_literals(self):
+        sql = substitute_literals(
+            SQL_BY_DATE, ['2025-11-28'], ['2025-11-27']
+        )
+        assert "'2025-11-27'" in sql
+
+    def test_substitute_requires_literal_in_sql(self):
+        assert substitute_literals(SQL_BY_DATE, ['5'], ['7']) is None
+
+
+class TestSqlSpeculator:
+
+    def test_predict_from_template(self):
+        speculator = SqlSpeculator()
+        speculator.remember(
+            'На сколько просмотров выросли все видео 28 ноября 2025?',
+            SQL_BY_DATE
+        )
+        sql = speculator.predict(
+            'на сколько просмотров выросли все видео 27 ноября 2025'
+        )
+        assert sql == SQL_BY_DATE.replace('2025-11-28', '2025-11-27')
+
+    def test_no_prediction_for_unrelated_question(self):
+        speculator = SqlSpeculator()
+        speculator.remember(
+            'Сколько всего видео?', 'SELECT COUNT(*) FROM videos;'
+        )
+        assert speculator.predict('Сколько лайков у креатора abc?') is None
+
+    def test_index_is_bounded(self):
+        speculator = SqlSpeculator()
+        speculator.size = 2
+        for word in ('лайков', 'просмотров', 'комментариев'):
+            speculator.remember(f'Сколько {word}?', 'SELECT 1;')
+        assert len(speculator.index) == 2
+
+
+class TestSpeculation:
+
+    def test_canonical_sql_ignores_formatting(self):
+        assert canonical_sql('select count(*)  from VIDEOS') == (
+            canonical_sql('SELECT COUNT(*) FROM videos;')
+        )
+
+    def test_equivalent_sql_uses_precomputed_result(self):
+        async def run():
+            task = asyncio.create_task(asyncio.sleep(0, result=42))
+            speculation = Speculation('SELECT COUNT(*) FROM videos;', task)
+            return await speculation.result_for('select count(*) from videos')
+
+        assert asyncio.run(run()) == 42
+
+    def test_different_sql_cancels_speculation(self):
+        async def run():
+            task = asyncio.create_task(asyncio.sleep(10))
+            speculation = Speculation('SELECT COUNT(*) FROM videos;', task)
+            result = await speculation.result_for(
+                'SELECT COUNT(*) FROM video_snapshots;'
+            )
+            await asyncio.gather(task, return_exceptions=True)
+            return result, task.cancelled()
+
+        assert asyncio.run(run()) == (None, True)
+
+    def test_speculative_query_has_own_stage(self, monkeypatch):
+        stages = []
+
+        async def execute_raw_query(sql, timeout_ms=None, stage='db'):
+            stages.append(stage)
+            return 7
+
+        monkeypatch.setattr(
+            'app.speculation.db.execute_raw_query', execute_raw_query
+        )
+        speculator = SqlSpeculator()
+        speculator.remember(
+            'На сколько просмотров выросли все видео 28 ноября 2025?',
+            SQL_BY_DATE
+        )
+
+        async def run():
+            async with speculator.speculate(
+                'На сколько просмотров выросли все видео 27 ноября 2025?',
+                Deadline(5)
+            ) as speculation:
+                return await speculation.task
+
+        assert asyncio.run(run()) == 7
+        assert stages == ['speculative_db']
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app.tasks import ChatTaskRegistry, Deadline
+
+
+class TestDeadline:
+
+    def test_remaining_within_budget(self):
+        deadline = Deadline(10)
+        assert 0 < deadline.remaining() <= 10
+        assert deadline.remaining_seconds() == 10
+        assert deadline.remaining_ms() > 9000
+
+    def test_expired_deadline_raises(self):
+        deadline = Deadline(0)
+        with pytest.raises(asyncio.TimeoutError):
+            deadline.remaining()
+
+
+class TestChatTaskRegistry:
+
+    def test_newer_message_cancels_previous(self):
+        registry = ChatTaskRegistry()
+        started = asyncio.Event()
+
+        async def handle(wait: bool):
+            with registry.track(1):
+                started.set()
+                if wait:
+                    await asyncio.sleep(10)
+                return 'done'
+
+        async def scenario():
+            first = asyncio.create_task(handle(wait=True))
+            await started.wait()
+            second = asyncio.create_task(handle(wait=False))
+            assert await second == 'done'
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            assert registry.get(1) is None
+
+        asyncio.run(scenario())
+
+    def test_other_chats_are_not_cancelled(self):
+        registry = ChatTaskRegistry()
+
+        async def handle(chat_id: int, delay: float):
+            with registry.track(chat_id):
+                await asyncio.sleep(delay)
+                return chat_id
+
+        async def scenario():
+            return await asyncio.gather(handle(1, 0.01), handle(2, 0))
+
+        assert asyncio.run(scenario()) == [1, 2]
+
+    def test_newer_message_elsewhere_cancels_older_only(self):
+        registry = ChatTaskRegistry()
+        started = asyncio.Event()
+
+        async def handle():
+            with registry.track(1, message_id=5):
+                started.set()
+                await asyncio.sleep(10)
+
+        async def scenario():
+            task = asyncio.create_task(handle())
+            await started.wait()
+            registry.cancel_older(1, 5)
+            registry.cancel_older(2, 9)
+            await asyncio.sleep(0)
+            assert not task.done()
+            registry.cancel_older(1, 6)
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(scenario())
@@ -0,0 +1,34 @@
+import json
+import logging
+
+import pytest
+
+from app.tracing import current_trace, set_attribute, span, start_trace
+
+
+class TestTracing:
+
+    def test_spans_recorded_on_active_trace(self):
+        with start_trace('request', user_id=1) as trace:
+            with span('db', rows=1):
+                pass
+            set_attribute('sql', 'SELECT 1;')
+        assert current_trace() is None
+        assert [s['name'] for s in trace.spans] == ['db']
+        assert trace.spans[0]['rows'] == 1
+        assert trace.attributes == {'user_id': 1, 'sql': 'SELECT 1;'}
+        assert trace.duration is not None
+
+    def test_span_without_trace_is_noop(self):
+        with span('db'):
+            pass
+        assert current_trace() is None
+
+    def test_failed_trace_always_emitted(self, caplog):
+        caplog.set_level(logging.INFO, logger='app.trace')
+        with pytest.raises(RuntimeError):
+            with start_trace('request'):
+                raise RuntimeError('boom')
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record['name'] == 'request'
+        assert record['error'] == 'RuntimeError'